@@ -1,4 +1,18 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from agents.analyzer import CATEGORY_BY_TOPIC
+
+# A second topic scoring at least this share of the first gets one suggestion of its own
+SECONDARY_SHARE = 0.5
+
+def secondary_category(analysis: Dict) -> Optional[str]:
+    """Category of the runner-up topic when the message clearly blends two intents"""
+    scores = analysis.get("scores", {}).get("topics") or {}
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if len(ranked) < 2 or ranked[1][1] <= 0 or ranked[1][1] < SECONDARY_SHARE * ranked[0][1]:
+        return None
+    category = CATEGORY_BY_TOPIC.get(ranked[1][0])
+    return category if category != analysis.get("category") else None
 
 class ActionSuggester:
     def suggest(self, analysis: Dict[str, str]) -> List[str]:
@@ -37,4 +51,8 @@ class ActionSuggester:
             ]
         }
 
-        return suggestions.get(category, suggestions["general"])
+        primary = suggestions.get(category, suggestions["general"])
+        secondary = secondary_category(analysis)
+        if secondary:
+            return primary[:2] + suggestions[secondary][:1]
+        return primary
@@ -1,27 +1,205 @@
 import re
-from typing import Dict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Rules in priority order: ties between topics resolve to the earlier rule
+RULES = [
+    ("confusion", "confused", "life_decision", ["career", "job", "work", "profession", "confusion", "choice"]),
+    ("fear", "fearful", "emotional", ["fear", "afraid", "scared", "worry", "anxious"]),
+    ("duty", "burdened", "dharma", ["duty", "responsibility", "should", "must", "obligation"]),
+    ("attachment", "attached", "spiritual", ["attached", "attachment", "let go", "holding"]),
+    ("knowledge", "curious", "learning", ["learn", "knowledge", "wisdom", "understand"]),
+    ("peace", "stressed", "emotional", ["stress", "peace", "calm", "overwhelm"]),
+]
+
+TOPICS = [rule[0] for rule in RULES]
+EMOTIONS = [rule[1] for rule in RULES]
+CATEGORY_BY_TOPIC = {rule[0]: rule[2] for rule in RULES}
+
+# Words that signal a feeling without naming a topic
+EMOTION_WORDS = {
+    "confused": ["lost", "unsure", "torn", "uncertain", "clueless"],
+    "fearful": ["terrified", "nervous", "panic", "dread", "frighten"],
+    "burdened": ["burden", "guilt", "pressure", "trapped"],
+    "attached": ["miss", "cling", "obsess", "longing"],
+    "curious": ["curious", "wondering", "question"],
+    "stressed": ["tired", "exhausted", "restless", "tense", "frustrat", "burnout"],
+}
+
+# Vector layout: one score per topic, then one per emotion
+LABELS = TOPICS + EMOTIONS
+
+# Modifiers scale the next keyword within MODIFIER_WINDOW words
+INTENSIFIERS = {
+    "very": 1.5, "really": 1.5, "so": 1.3, "too": 1.3, "extremely": 2.0, "deeply": 1.7,
+    "incredibly": 1.8, "totally": 1.5, "completely": 1.5, "constantly": 1.5, "always": 1.3,
+    "slightly": 0.5, "somewhat": 0.6, "little": 0.6, "bit": 0.6, "barely": 0.4,
+}
+NEGATORS = frozenset({
+    "not", "no", "never", "nothing", "without", "hardly", "cannot", "cant", "can't", "dont", "don't",
+    "doesnt", "doesn't", "isnt", "isn't", "wasnt", "wasn't", "wont", "won't", "nor",
+})
+MODIFIER_WINDOW = 3
+# "not afraid" still concerns fear, but speaks against feeling it
+NEGATED_TOPIC_WEIGHT = 0.5
+NEGATED_EMOTION_WEIGHT = -0.5
+# Phrases whose negation is the feeling itself ("I can't let go")
+NEGATION_EXEMPT = frozenset({"let go"})
+
+# Lexicon matrices: row per keyword, column per topic / emotion
+TOPIC_KEYWORDS = [word for rule in RULES for word in rule[3]]
+EMOTION_KEYWORDS = [word for words in EMOTION_WORDS.values() for word in words]
+KEYWORDS = TOPIC_KEYWORDS + EMOTION_KEYWORDS
+KEYWORD_INDEX = {word: i for i, word in enumerate(KEYWORDS)}
+
+
+def _lexicons() -> Tuple[np.ndarray, np.ndarray]:
+    """Topic keywords score their topic and its emotion; emotion words only their emotion"""
+    topics = np.zeros((len(KEYWORDS), len(TOPICS)))
+    emotions = np.zeros((len(KEYWORDS), len(EMOTIONS)))
+    for i, (_, _, _, words) in enumerate(RULES):
+        for word in words:
+            topics[KEYWORD_INDEX[word], i] = 1.0
+            emotions[KEYWORD_INDEX[word], i] = 1.0
+    for emotion, words in EMOTION_WORDS.items():
+        for word in words:
+            emotions[KEYWORD_INDEX[word], EMOTIONS.index(emotion)] = 1.0
+    return topics, emotions
+
+
+TOPIC_LEXICON, EMOTION_LEXICON = _lexicons()
+# Sparse rows of the same lexicons for scoring a single message without matrix setup
+TOPIC_COLUMNS = [np.flatnonzero(row).tolist() for row in TOPIC_LEXICON]
+EMOTION_COLUMNS = [(len(TOPICS) + np.flatnonzero(row)).tolist() for row in EMOTION_LEXICON]
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """Factor shared prefixes so the regex engine walks each position like a trie"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        ends_here = "" in node
+        body = branches[0] if len(branches) == 1 and not ends_here else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if ends_here else body
+
+    return build(trie)
+
+
+# Compiled once. Topic keywords match anywhere, as the original rule chain's
+# re.search did ("homework" is work, "misunderstand" is understand)
+TOPIC_PATTERN = re.compile(_trie_pattern(TOPIC_KEYWORDS))
+# Every word whole, for modifiers; emotion-only words match at word starts only
+# ("frustrated" is frustrat, but "dismiss" is not miss) and come in group 1
+TOKEN_PATTERN = re.compile(f"\\b({_trie_pattern(EMOTION_KEYWORDS)})|[a-z']+")
 
 class InputAnalyzer:
-    def analyze(self, message: str) -> Dict[str, str]:
-        msg = message.lower()
+    """Lexicon scorer: a vector over LABELS per message, labelled by its strongest topic and emotion"""
+
+    @staticmethod
+    def _hits(message: str) -> List[Tuple[int, float, float]]:
+        """(keyword, topic weight, emotion weight) for each keyword in the message"""
+        hits = []
+        scale, negated, window = 1.0, False, 0
+        text = message.lower()
+        topic_matches = TOPIC_PATTERN.finditer(text)
+        topic_match = next(topic_matches, None)
+        for match in TOKEN_PATTERN.finditer(text):
+            # Topic keywords starting inside this token belong to it
+            keywords = []
+            while topic_match is not None and topic_match.start() < match.end():
+                keywords.append(topic_match.group(0))
+                topic_match = next(topic_matches, None)
+            if match.group(1) is not None:
+                keywords.append(match.group(1))
+            if keywords:
+                for keyword in keywords:
+                    if negated and keyword not in NEGATION_EXEMPT:
+                        hits.append((KEYWORD_INDEX[keyword], scale * NEGATED_TOPIC_WEIGHT,
+                                     scale * NEGATED_EMOTION_WEIGHT))
+                    else:
+                        hits.append((KEYWORD_INDEX[keyword], scale, scale))
+                scale, negated, window = 1.0, False, 0
+                continue
+
+            word = match.group(0)
+            if word in NEGATORS:
+                negated = not negated
+                window = MODIFIER_WINDOW
+            elif word in INTENSIFIERS:
+                scale *= INTENSIFIERS[word]
+                window = MODIFIER_WINDOW
+            elif window:
+                window -= 1
+                if not window:
+                    scale, negated = 1.0, False
+        return hits
 
-        if re.search(r"career|job|work|profession|confusion|choice", msg):
-            return {"topic": "confusion", "emotion": "confused", "category": "life_decision"}
+    def score_many(self, messages: List[str]) -> np.ndarray:
+        """(len(messages), len(LABELS)) matrix of non-negative topic and emotion scores"""
+        cells, topic_weights, emotion_weights = [], [], []
+        for row, message in enumerate(messages):
+            for keyword, topic_weight, emotion_weight in self._hits(message):
+                cells.append(row * len(KEYWORDS) + keyword)
+                topic_weights.append(topic_weight)
+                emotion_weights.append(emotion_weight)
 
-        if re.search(r"fear|afraid|scared|worry|anxious", msg):
-            return {"topic": "fear", "emotion": "fearful", "category": "emotional"}
+        # Weighted keyword counts per message, then one product with each lexicon
+        shape = (len(messages), len(KEYWORDS))
+        size = shape[0] * shape[1]
+        topic_counts = np.bincount(cells, topic_weights, minlength=size).reshape(shape)
+        emotion_counts = np.bincount(cells, emotion_weights, minlength=size).reshape(shape)
+        scores = np.hstack([topic_counts @ TOPIC_LEXICON, emotion_counts @ EMOTION_LEXICON])
+        return np.maximum(scores, 0.0)
 
-        if re.search(r"duty|responsibility|should|must|obligation", msg):
-            return {"topic": "duty", "emotion": "burdened", "category": "dharma"}
+    def score(self, message: str) -> np.ndarray:
+        """Fixed-length score vector over LABELS for one message"""
+        scores = [0.0] * len(LABELS)
+        for keyword, topic_weight, emotion_weight in self._hits(message):
+            for column in TOPIC_COLUMNS[keyword]:
+                scores[column] += topic_weight
+            for column in EMOTION_COLUMNS[keyword]:
+                scores[column] += emotion_weight
+        return np.maximum(np.array(scores), 0.0)
 
-        if re.search(r"attached|attachment|let go|holding", msg):
-            return {"topic": "attachment", "emotion": "attached", "category": "spiritual"}
+    @staticmethod
+    def label(vector: np.ndarray) -> Dict:
+        """Analysis dict for a score vector: strongest topic and emotion plus every score"""
+        values = [round(value, 3) if value else 0.0 for value in vector.tolist()]
+        topic_scores = values[:len(TOPICS)]
+        emotion_scores = values[len(TOPICS):]
+        top = max(topic_scores)
+        if top > 0:
+            # index() finds the first maximum, so ties still go to the earlier rule
+            topic = TOPICS[topic_scores.index(top)]
+            category = CATEGORY_BY_TOPIC[topic]
+        else:
+            # Default case
+            topic, category = "duty", "general"
+        strongest = max(emotion_scores)
+        emotion = EMOTIONS[emotion_scores.index(strongest)] if strongest > 0 else "neutral"
 
-        if re.search(r"learn|knowledge|wisdom|understand", msg):
-            return {"topic": "knowledge", "emotion": "curious", "category": "learning"}
+        return {
+            "topic": topic,
+            "emotion": emotion,
+            "category": category,
+            "scores": {
+                "topics": dict(zip(TOPICS, topic_scores)),
+                "emotions": dict(zip(EMOTIONS, emotion_scores)),
+            },
+        }
 
-        if re.search(r"stress|peace|calm|overwhelm", msg):
-            return {"topic": "peace", "emotion": "stressed", "category": "emotional"}
+    def analyze(self, message: str) -> Dict:
+        return self.label(self.score(message))
 
-        # Default case
-        return {"topic": "duty", "emotion": "neutral", "category": "general"}
+    def analyze_many(self, messages: List[str]) -> List[Dict]:
+        """Batch analysis for bulk re-scoring of stored interactions: one score matrix for all"""
+        return [self.label(vector) for vector in self.score_many(messages)]
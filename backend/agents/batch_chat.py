@@ -0,0 +1,126 @@
+"""
+Batch Chat: runs the four agents over many messages at once
+For evaluation and re-scoring jobs that replay archived messages
+
+Messages are processed in chunks. Per chunk: one analyze_many call, one
+find_many call (a single matrix multiply in semantic mode), concurrent
+generation (which the LLM backend micro-batches), and one transaction that
+writes every new session, interaction and session update of the chunk.
+"""
+
+import asyncio
+import uuid
+from concurrent.futures import Executor
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from config import BATCH_CHAT_CHUNK_SIZE
+from database import now_ms
+from utils.logger import get_logger
+from utils.session_state import emotion_vector, empty_summary
+
+logger = get_logger("batch_chat")
+
+# generate(message, verse, analysis, recent_turns, summary) -> response text
+Generate = Callable[[str, Dict, Dict, List[Dict], Optional[Dict]], Awaitable[str]]
+
+
+class BatchChat:
+    """Batched /chat: same agents, same stored rows, a fraction of the round trips"""
+
+    def __init__(self, analyzer, verse_finder, action_suggester, generate: Generate,
+                 session_manager, memory_manager, executor: Optional[Executor] = None,
+                 chunk_size: int = BATCH_CHAT_CHUNK_SIZE):
+        self.analyzer = analyzer
+        self.verse_finder = verse_finder
+        self.action_suggester = action_suggester
+        self.generate = generate
+        self.session_manager = session_manager
+        self.memory_manager = memory_manager
+        self.db = session_manager.db
+        self.executor = executor
+        self.chunk_size = chunk_size
+
+    async def run(self, items: List[Dict], semantic: bool = False) -> AsyncIterator[Dict]:
+        """Yield one result per item, in order, as each chunk is committed
+
+        Items are {"user_id", "message", "session_id"?}. Items without a session
+        share one new session per user_id for the whole batch.
+        """
+        # Buffered /chat writes land first, so session state read below is current
+        await self.db.flush()
+        created: Dict[str, str] = {}
+        for start in range(0, len(items), self.chunk_size):
+            for offset, result in enumerate(await self._run_chunk(items[start:start + self.chunk_size], semantic, created)):
+                yield {"index": start + offset, **result}
+
+    async def _run_chunk(self, items: List[Dict], semantic: bool, created: Dict[str, str]) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        messages = [item["message"] for item in items]
+
+        analyses = self.analyzer.analyze_many(messages)
+
+        # Resolve sessions; new ones are inserted in the same transaction as their turns.
+        # Ids of expired or deleted sessions are treated like no id at all
+        given = [session_id for session_id in dict.fromkeys(item.get("session_id") for item in items) if session_id]
+        known = {
+            session_id for session_id, live in zip(given, await asyncio.gather(*(self.session_manager.exists(s) for s in given)))
+            if live
+        }
+        new_sessions: List[tuple] = []
+        session_ids: List[str] = []
+        for item in items:
+            session_id = item.get("session_id")
+            session_id = (session_id if session_id in known else None) or created.get(item["user_id"])
+            if not session_id:
+                session_id = created[item["user_id"]] = str(uuid.uuid4())
+                timestamp = now_ms()
+                new_sessions.append((session_id, item["user_id"], 'neutral', timestamp, timestamp))
+            session_ids.append(session_id)
+
+        verses = await loop.run_in_executor(self.executor, self.verse_finder.find_many, analyses, messages,
+                                             semantic, session_ids)
+
+        # Context is loaded once per session per chunk, not once per message
+        fresh = {row[0] for row in new_sessions}
+        existing = [session_id for session_id in dict.fromkeys(session_ids) if session_id not in fresh]
+        contexts = dict(zip(existing, await asyncio.gather(*(self.memory_manager.get_context(s) for s in existing))))
+        summaries = {session_id: (contexts[session_id]["summary"] if session_id in contexts else empty_summary())
+                     for session_id in dict.fromkeys(session_ids)}
+
+        responses = await asyncio.gather(*(
+            self.generate(message, verse, analysis,
+                          contexts[session_id]["recent"] if session_id in contexts else [],
+                          summaries[session_id])
+            for message, verse, analysis, session_id in zip(messages, verses, analyses, session_ids)
+        ))
+
+        interactions: List[Dict] = []
+        turns: Dict[str, List[Dict]] = {}
+        for message, verse, analysis, session_id, response in zip(messages, verses, analyses, session_ids, responses):
+            interactions.append(self.memory_manager.build_interaction(session_id, message, response, analysis, verse))
+            turns.setdefault(session_id, []).append({
+                "topic": analysis["topic"],
+                "emotion": analysis["emotion"],
+                "emotions": emotion_vector(analysis["emotion"], analysis["scores"]["emotions"]),
+                "last_activity": interactions[-1]["timestamp"],
+            })
+
+        await self.db.save_batch(new_sessions, interactions, turns)
+
+        # Cached copies of these sessions predate the batch
+        for session_id in turns:
+            self.session_manager.cache.pop(session_id)
+            self.memory_manager.history_cache.pop(session_id)
+
+        logger.info("[BatchChat] Processed %d messages across %d sessions (%d new)",
+                    len(items), len(turns), len(new_sessions))
+        return [
+            {
+                "session_id": session_id,
+                "response": response,
+                "verse": verse,
+                "suggestions": self.action_suggester.suggest(analysis),
+                "analysis": analysis,
+            }
+            for session_id, response, verse, analysis in zip(session_ids, responses, verses, analyses)
+        ]
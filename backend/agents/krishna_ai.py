@@ -1,156 +1,281 @@
 import random
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+from config import RESPONSE_MEMO_SIZE
+from tools.llm_backend import GenerationBackend
+from utils.cache import LRUCache
+from utils.logger import get_logger
+from utils.metrics import GENERATIONS
+
+logger = get_logger("krishna_ai")
+
+# Where the verse translation is spliced into a template
+TRANSLATION_SLOT = "{translation}"
+
+# Earlier user messages included in an LLM prompt
+PROMPT_HISTORY_TURNS = 3
+
+PROMPT_PREAMBLE = (
+    "You are Krishna from the Bhagavad Gita, speaking to a friend with warmth and clarity. "
+    "Ground your answer in the verse below, quote it once, and end with three short, "
+    "practical steps."
+)
+
+# Response variants per topic; compiled once by KrishnaAI
+TEMPLATES: Dict[str, Tuple[str, ...]] = {
+    "confusion": (
+        (
+            "Dear friend, I sense the confusion in your heart. When Arjuna faced a similar dilemma "
+            "on the battlefield, he too was paralyzed by doubt.\n\n"
+            'The Gita teaches us: "{translation}"\n\n'
+            "Your duty is clear — to act with sincerity and dedication. The results? They are not yours "
+            "to control. Focus on doing your best, not on guaranteeing outcomes.\n\n"
+            "💫 Actions for you:\n"
+            "1. List what truly matters to you in this decision\n"
+            "2. Take one small step today without worrying about the end\n"
+            "3. Trust the process — clarity comes through action, not overthinking"
+        ),
+        (
+            "I understand your uncertainty, dear one. Every soul faces such crossroads.\n\n"
+            '"{translation}"\n\n'
+            "The path forward becomes clear when we focus on our dharma — our righteous duty. What feels "
+            "aligned with your values? What action, if taken, would you respect yourself for?\n\n"
+            "💫 Your next steps:\n"
+            "1. Write down what your inner voice whispers (not what others say)\n"
+            "2. Choose the path that serves your growth, not just comfort\n"
+            "3. Act with courage, knowing I am with you"
+        ),
+    ),
+
+    "fear": (
+        (
+            "My dear friend, fear is natural. Even the greatest warriors feel it. But remember what I told Arjuna:\n\n"
+            '"{translation}"\n\n'
+            "When darkness seems overwhelming, know that divine protection is always present. Your fear shows "
+            "you care deeply — that's beautiful. Now channel it into courageous action.\n\n"
+            "💫 Three practices for you:\n"
+            "1. Breathe deeply — you are safe in this moment\n"
+            "2. Name your fear — what exactly worries you?\n"
+            "3. Take one brave step today, however small"
+        ),
+        (
+            "I hear the trembling in your heart. Fear whispers lies, but truth speaks through your courage.\n\n"
+            '"{translation}"\n\n'
+            "You are stronger than you know. Every challenge is an opportunity to discover your inner strength. "
+            "I am always here, guiding you through the storms.\n\n"
+            "💫 Your courage practice:\n"
+            "1. Recall a past fear you overcame — you did it before!\n"
+            "2. Trust that this too shall pass\n"
+            "3. Move forward with faith, not fear"
+        ),
+    ),
+
+    "duty": (
+        (
+            "Ah, the sacred question of duty! This is the very heart of the Gita's teaching.\n\n"
+            '"{translation}"\n\n'
+            "Your dharma is your unique path. Perform it with love, not attachment to results. The act itself is "
+            "sacred when done with pure intention.\n\n"
+            "💫 Living your dharma:\n"
+            "1. Ask: \"What is mine to do?\" (not \"What will I get?\")\n"
+            "2. Do it with excellence and devotion\n"
+            "3. Release the outcome — you've done your part"
+        ),
+        (
+            "Dear seeker, duty is not burden — it's your sacred offering to the universe.\n\n"
+            '"{translation}"\n\n'
+            "When you act without craving rewards, you experience true freedom. Your work becomes worship. "
+            "Your effort becomes grace.\n\n"
+            "💫 Transform your work:\n"
+            "1. Before starting, set a pure intention\n"
+            "2. Give your full presence to the task\n"
+            "3. Offer the results to something greater than yourself"
+        ),
+    ),
+
+    "attachment": (
+        (
+            "Beautiful soul, attachment is the root of suffering. I see you trying to hold water in your hands.\n\n"
+            '"{translation}"\n\n'
+            "Love fully, but hold lightly. Enjoy the gift, but don't demand it stay forever. Everything flows — "
+            "this is the nature of life.\n\n"
+            "💫 Practice detachment:\n"
+            "1. Appreciate what you have RIGHT NOW\n"
+            "2. Accept that change is inevitable and sacred\n"
+            "3. Trust that letting go creates space for new blessings"
+        ),
+        (
+            "My friend, your heart seeks security in the impermanent. This causes pain.\n\n"
+            '"{translation}"\n\n'
+            "True peace comes from equanimity — being balanced in gain and loss. What you seek externally "
+            "already exists within you.\n\n"
+            "💫 Find inner peace:\n"
+            "1. Notice where you're clinging — can you soften your grip?\n"
+            "2. Practice gratitude for the present moment\n"
+            "3. Trust the divine timing of all things"
+        ),
+    ),
+
+    "knowledge": (
+        (
+            "Seeker of truth, your thirst for knowledge is beautiful!\n\n"
+            '"{translation}"\n\n'
+            "True wisdom comes not just from books, but from humble inquiry and sincere practice. Learn, apply, "
+            "and experience.\n\n"
+            "💫 Your learning path:\n"
+            "1. Study with an open, humble heart\n"
+            "2. Practice what you learn — knowledge without action is incomplete\n"
+            "3. Share your wisdom to deepen your understanding"
+        ),
+        (
+            "Dear student, the path of knowledge is sacred.\n\n"
+            '"{translation}"\n\n'
+            "Wisdom transforms you. It's not just information — it's realization. Approach learning as a "
+            "spiritual practice.\n\n"
+            "💫 Deepen your wisdom:\n"
+            "1. Question deeply, but doubt humbly\n"
+            "2. Meditate on what you learn\n"
+            "3. Let knowledge guide your actions"
+        ),
+    ),
+
+    "peace": (
+        (
+            "Beloved friend, you seek the peace that already dwells within you.\n\n"
+            '"{translation}"\n\n'
+            "Equanimity is not indifference — it's inner stability amidst life's storms. The ocean's depths remain "
+            "calm even when waves crash above.\n\n"
+            "💫 Cultivate peace:\n"
+            "1. Practice viewing challenges as opportunities\n"
+            "2. Respond, don't react — pause before acting\n"
+            "3. Remember: \"This too shall pass\""
+        ),
+        (
+            "Dear one, peace is your natural state. Stress is resistance to what is.\n\n"
+            '"{translation}"\n\n'
+            "Acceptance doesn't mean giving up — it means engaging wisely. Flow with life, not against it.\n\n"
+            "💫 Return to peace:\n"
+            "1. Take 3 deep breaths right now\n"
+            "2. Accept this moment exactly as it is\n"
+            "3. Take aligned action from a calm center"
+        ),
+    ),
+}
+
+
+def _compile(template: str) -> Tuple[str, str]:
+    """Split a template around its translation slot so rendering is one concatenation"""
+    before, _, after = template.partition(TRANSLATION_SLOT)
+    return before, after
+
 
 class KrishnaAI:
 
+    def __init__(self, seed: Optional[int] = None, memo_size: int = RESPONSE_MEMO_SIZE,
+                 backend: Optional[GenerationBackend] = None):
+        # Optional LLM; templates are the fallback whenever it is slow or down
+        self.backend = backend
+        # Compiled once: topic -> tuple of (text before, text after) the translation
+        self.templates: Dict[str, Tuple[Tuple[str, str], ...]] = {
+            topic: tuple(_compile(template) for template in variants)
+            for topic, variants in TEMPLATES.items()
+        }
+        # A seed makes the variant sequence, and so the responses, reproducible
+        self._rng = random.Random(seed)
+        # (topic, verse id, variant) -> rendered text; verse texts never change at runtime
+        self.rendered = LRUCache(memo_size, float("inf"))
+
+    def choose_variant(self, topic: str) -> int:
+        """Pick which of the topic's templates to render"""
+        return self._rng.randrange(len(self.templates.get(topic) or self.templates["duty"]))
+
+    def render(self, topic: str, verse: Dict[str, str], variant: int) -> str:
+        """Render one template variant for a verse, memoized per (topic, verse id, variant)"""
+        if topic not in self.templates:
+            topic = "duty"
+        key = (topic, verse.get("id"), variant)
+        if key[1] is not None:
+            cached = self.rendered.get(key)
+            if cached is not None:
+                return cached
+
+        before, after = self.templates[topic][variant]
+        text = before + verse.get("translation", "") + after
+        if key[1] is not None:
+            self.rendered.set(key, text)
+        return text
+
     def generate(self, message: str, verse: Dict[str, str], analysis: Dict[str, str], conversation_history: List[Dict]) -> str:
 
         topic = analysis.get("topic", "duty")
-        translation = verse.get("translation", "")
-
-        responses = {
-            "confusion": [
-                (
-                    "Dear friend, I sense the confusion in your heart. When Arjuna faced a similar dilemma "
-                    "on the battlefield, he too was paralyzed by doubt.\n\n"
-                    f'The Gita teaches us: "{translation}"\n\n'
-                    "Your duty is clear — to act with sincerity and dedication. The results? They are not yours "
-                    "to control. Focus on doing your best, not on guaranteeing outcomes.\n\n"
-                    "💫 Actions for you:\n"
-                    "1. List what truly matters to you in this decision\n"
-                    "2. Take one small step today without worrying about the end\n"
-                    "3. Trust the process — clarity comes through action, not overthinking"
-                ),
-                (
-                    "I understand your uncertainty, dear one. Every soul faces such crossroads.\n\n"
-                    f'"{translation}"\n\n'
-                    "The path forward becomes clear when we focus on our dharma — our righteous duty. What feels "
-                    "aligned with your values? What action, if taken, would you respect yourself for?\n\n"
-                    "💫 Your next steps:\n"
-                    "1. Write down what your inner voice whispers (not what others say)\n"
-                    "2. Choose the path that serves your growth, not just comfort\n"
-                    "3. Act with courage, knowing I am with you"
-                ),
-            ],
-
-            "fear": [
-                (
-                    "My dear friend, fear is natural. Even the greatest warriors feel it. But remember what I told Arjuna:\n\n"
-                    f'"{translation}"\n\n'
-                    "When darkness seems overwhelming, know that divine protection is always present. Your fear shows "
-                    "you care deeply — that's beautiful. Now channel it into courageous action.\n\n"
-                    "💫 Three practices for you:\n"
-                    "1. Breathe deeply — you are safe in this moment\n"
-                    "2. Name your fear — what exactly worries you?\n"
-                    "3. Take one brave step today, however small"
-                ),
-                (
-                    "I hear the trembling in your heart. Fear whispers lies, but truth speaks through your courage.\n\n"
-                    f'"{translation}"\n\n'
-                    "You are stronger than you know. Every challenge is an opportunity to discover your inner strength. "
-                    "I am always here, guiding you through the storms.\n\n"
-                    "💫 Your courage practice:\n"
-                    "1. Recall a past fear you overcame — you did it before!\n"
-                    "2. Trust that this too shall pass\n"
-                    "3. Move forward with faith, not fear"
-                ),
-            ],
-
-            "duty": [
-                (
-                    "Ah, the sacred question of duty! This is the very heart of the Gita's teaching.\n\n"
-                    f'"{translation}"\n\n'
-                    "Your dharma is your unique path. Perform it with love, not attachment to results. The act itself is "
-                    "sacred when done with pure intention.\n\n"
-                    "💫 Living your dharma:\n"
-                    "1. Ask: \"What is mine to do?\" (not \"What will I get?\")\n"
-                    "2. Do it with excellence and devotion\n"
-                    "3. Release the outcome — you've done your part"
-                ),
-                (
-                    "Dear seeker, duty is not burden — it's your sacred offering to the universe.\n\n"
-                    f'"{translation}"\n\n'
-                    "When you act without craving rewards, you experience true freedom. Your work becomes worship. "
-                    "Your effort becomes grace.\n\n"
-                    "💫 Transform your work:\n"
-                    "1. Before starting, set a pure intention\n"
-                    "2. Give your full presence to the task\n"
-                    "3. Offer the results to something greater than yourself"
-                ),
-            ],
-
-            "attachment": [
-                (
-                    "Beautiful soul, attachment is the root of suffering. I see you trying to hold water in your hands.\n\n"
-                    f'"{translation}"\n\n'
-                    "Love fully, but hold lightly. Enjoy the gift, but don't demand it stay forever. Everything flows — "
-                    "this is the nature of life.\n\n"
-                    "💫 Practice detachment:\n"
-                    "1. Appreciate what you have RIGHT NOW\n"
-                    "2. Accept that change is inevitable and sacred\n"
-                    "3. Trust that letting go creates space for new blessings"
-                ),
-                (
-                    "My friend, your heart seeks security in the impermanent. This causes pain.\n\n"
-                    f'"{translation}"\n\n'
-                    "True peace comes from equanimity — being balanced in gain and loss. What you seek externally "
-                    "already exists within you.\n\n"
-                    "💫 Find inner peace:\n"
-                    "1. Notice where you're clinging — can you soften your grip?\n"
-                    "2. Practice gratitude for the present moment\n"
-                    "3. Trust the divine timing of all things"
-                ),
-            ],
-
-            "knowledge": [
-                (
-                    "Seeker of truth, your thirst for knowledge is beautiful!\n\n"
-                    f'"{translation}"\n\n'
-                    "True wisdom comes not just from books, but from humble inquiry and sincere practice. Learn, apply, "
-                    "and experience.\n\n"
-                    "💫 Your learning path:\n"
-                    "1. Study with an open, humble heart\n"
-                    "2. Practice what you learn — knowledge without action is incomplete\n"
-                    "3. Share your wisdom to deepen your understanding"
-                ),
-                (
-                    "Dear student, the path of knowledge is sacred.\n\n"
-                    f'"{translation}"\n\n'
-                    "Wisdom transforms you. It's not just information — it's realization. Approach learning as a "
-                    "spiritual practice.\n\n"
-                    "💫 Deepen your wisdom:\n"
-                    "1. Question deeply, but doubt humbly\n"
-                    "2. Meditate on what you learn\n"
-                    "3. Let knowledge guide your actions"
-                ),
-            ],
-
-            "peace": [
-                (
-                    "Beloved friend, you seek the peace that already dwells within you.\n\n"
-                    f'"{translation}"\n\n'
-                    "Equanimity is not indifference — it's inner stability amidst life's storms. The ocean's depths remain "
-                    "calm even when waves crash above.\n\n"
-                    "💫 Cultivate peace:\n"
-                    "1. Practice viewing challenges as opportunities\n"
-                    "2. Respond, don't react — pause before acting\n"
-                    "3. Remember: \"This too shall pass\""
-                ),
-                (
-                    "Dear one, peace is your natural state. Stress is resistance to what is.\n\n"
-                    f'"{translation}"\n\n'
-                    "Acceptance doesn't mean giving up — it means engaging wisely. Flow with life, not against it.\n\n"
-                    "💫 Return to peace:\n"
-                    "1. Take 3 deep breaths right now\n"
-                    "2. Accept this moment exactly as it is\n"
-                    "3. Take aligned action from a calm center"
-                ),
-            ],
-        }
-
-        topic_responses = responses.get(topic, responses["duty"])
-        selected = random.choice(topic_responses)
+        selected = self.render(topic, verse, self.choose_variant(topic))
 
-        print(f"[Agent 3] Krishna AI: Generated response for {analysis.get('category')} category")
+        logger.info("[Agent 3] Krishna AI: Generated response for %s category", analysis.get('category'))
 
         return selected
+
+    @staticmethod
+    def describe_summary(summary: Optional[Dict]) -> str:
+        """One line for the prompt, e.g. '12 earlier turns; topics: fear (5), work (4); recently: fear/anxious -> peace/calm'"""
+        if not summary or not summary.get("turns"):
+            return ""
+        topics = sorted(summary["topics"].items(), key=lambda item: -item[1])[:3]
+        parts = [
+            f"{summary['turns']} earlier turns",
+            "topics: " + ", ".join(f"{topic} ({count})" for topic, count in topics),
+        ]
+        if summary.get("path"):
+            parts.append("recently: " + " -> ".join(f"{topic}/{emotion}" for topic, emotion, _ in summary["path"][-3:]))
+        return "; ".join(parts)
+
+    def build_prompt(self, message: str, verse: Dict[str, str], analysis: Dict[str, str], history: List[Dict],
+                     summary: Optional[Dict] = None) -> str:
+        """Completion prompt: persona, verse, detected state, session summary and the last few user turns"""
+        lines = [
+            PROMPT_PREAMBLE,
+            "",
+            f"Verse (BG {verse.get('chapter')}.{verse.get('verse_num')}): {verse.get('translation', '')}",
+            f"The person seems {analysis.get('emotion', 'neutral')} and is asking about {analysis.get('topic', 'duty')}.",
+        ]
+        described = self.describe_summary(summary)
+        if described:
+            lines.append(f"Conversation so far: {described}.")
+        # History arrives newest first
+        earlier = [turn["user_message"] for turn in history[:PROMPT_HISTORY_TURNS] if turn.get("user_message")]
+        if earlier:
+            lines.append("Earlier they said: " + " | ".join(reversed(earlier)))
+        lines += ["", f"They say: {message}", "Krishna:"]
+        return "\n".join(lines)
+
+    async def generate_response(self, message: str, verse: Dict[str, str], analysis: Dict[str, str], history: List[Dict],
+                                summary: Optional[Dict] = None) -> str:
+        """Async entry point used by the API: LLM backend if configured, else templates"""
+        text, _ = await self.generate_with_source(message, verse, analysis, history, summary)
+        return text
+
+    async def generate_with_source(self, message: str, verse: Dict[str, str], analysis: Dict[str, str],
+                                   history: List[Dict], summary: Optional[Dict] = None) -> Tuple[str, str]:
+        """(response, source): source is "template", the backend's name, or "fallback" when the backend failed"""
+        if self.backend is None:
+            GENERATIONS.labels("template").inc()
+            return self.generate(message, verse, analysis, history), "template"
+
+        try:
+            text = await self.backend.generate(self.build_prompt(message, verse, analysis, history, summary))
+            if text:
+                GENERATIONS.labels(self.backend.name).inc()
+                logger.info("[Agent 3] Krishna AI: Generated response with %s backend", self.backend.name)
+                return text, self.backend.name
+            reason = "empty completion"
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}"
+
+        GENERATIONS.labels("fallback").inc()
+        logger.warning("[Agent 3] LLM backend unavailable (%s), using templates", reason)
+        return self.generate(message, verse, analysis, history), "fallback"
+
+    @staticmethod
+    def paragraphs(response: str) -> List[str]:
+        """Split a response into stream chunks that concatenate back to the original"""
+        paragraphs = response.split("\n\n")
+        return [paragraph + ("\n\n" if i < len(paragraphs) - 1 else "") for i, paragraph in enumerate(paragraphs)]
@@ -0,0 +1,86 @@
+"""
+Agent Orchestrator: runs agents as a dependency graph instead of a fixed sequence
+Independent stages run concurrently; CPU-bound stages are offloaded to a thread pool
+"""
+
+import asyncio
+import inspect
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+class Stage:
+    """One agent call: fn(ctx) sees the pipeline inputs plus the outputs of its deps"""
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any],
+                 deps: Iterable[str] = (), cpu_bound: bool = False):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.cpu_bound = cpu_bound
+
+class AgentOrchestrator:
+    """Executes a DAG of stages with asyncio and records per-stage timings"""
+
+    def __init__(self, stages: List[Stage], executor: Optional[Executor] = None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.executor = executor
+        self._check_graph()
+
+    def _check_graph(self):
+        """Reject unknown dependencies and cycles up front"""
+        visiting, done = set(), set()
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle in agent graph at stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def run(self, **inputs) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Run every stage as soon as its dependencies finish; returns (outputs, timings in ms)"""
+        loop = asyncio.get_running_loop()
+        ctx: Dict[str, Any] = dict(inputs)
+        timings: Dict[str, float] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def execute(stage: Stage):
+            if stage.deps:
+                await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+
+            start = time.perf_counter()
+            if stage.cpu_bound:
+                result = await loop.run_in_executor(self.executor, stage.fn, ctx)
+            else:
+                result = stage.fn(ctx)
+                if inspect.isawaitable(result):
+                    result = await result
+            timings[stage.name] = round((time.perf_counter() - start) * 1000, 3)
+
+            ctx[stage.name] = result
+            return result
+
+        start = time.perf_counter()
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.ensure_future(execute(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            # Collect the cancelled siblings so none is left with an unretrieved error
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        timings["total"] = round((time.perf_counter() - start) * 1000, 3)
+
+        return {name: ctx[name] for name in self.stages}, timings
@@ -1,15 +1,149 @@
-import json
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+
+from tools.verse_corpus import VerseCorpus
+from tools.verse_embeddings import VerseEmbeddings
+from tools.verse_index import FIELD_WEIGHTS, VerseIndex
+from utils.logger import get_logger
+from utils.seen_verses import SeenVerses
+
+logger = get_logger("verse_finder")
+
+# Detected topic is a strong signal, weigh it above any single message word
+TOPIC_BOOST = 2.0
+# Candidates rescored per request when avoiding repeats
+CANDIDATES = 8
+# Score multiplier for a verse the session has already been shown
+SEEN_PENALTY = 0.3
+
+
+def topic_boosts(analysis: Optional[Dict]) -> Dict[str, float]:
+    """Query boosts for every scored topic, the strongest at TOPIC_BOOST and the rest in proportion"""
+    if not analysis:
+        return {}
+    scores = analysis.get("scores", {}).get("topics") or {}
+    top = max(scores.values(), default=0.0)
+    if top > 0:
+        return {topic: TOPIC_BOOST * score / top for topic, score in scores.items() if score > 0}
+    return {analysis["topic"]: TOPIC_BOOST} if analysis.get("topic") else {}
+
+def semantic_query(message: str, analysis: Optional[Dict]) -> str:
+    """Embedding query text: the message with its detected topic appended"""
+    return f"{message} {(analysis or {}).get('topic', '')}"
 
 class VerseFinder:
-    def __init__(self, gita_data: Dict[str, Dict]):
-        self.gita_data = gita_data
+    def __init__(self, corpus: VerseCorpus, embeddings: Optional[VerseEmbeddings] = None,
+                 seen: Optional[SeenVerses] = None):
+        self.corpus = corpus
+        # Lazy view: a verse's text is only decoded when it is returned
+        self.verses = corpus.verses
+        self.topics: Dict[str, List[int]] = corpus.topics
+
+        # Built once at startup from just the indexed fields, every lookup after this is a posting-list walk
+        self.index = VerseIndex(corpus.project(FIELD_WEIGHTS))
+        self.embeddings = embeddings
+        # Verses each session has already been shown; None disables repeat avoidance
+        self.seen = seen
+
+    def _rank(self, message: str, analysis: Dict[str, str] = None, k: int = 5) -> List[Tuple[int, float]]:
+        """Top-k (verse position, score) pairs for the message and detected topics"""
+        # Blended intents: secondary topics pull in verses too, at lower weight
+        query = VerseIndex.build_query([message], topic_boosts(analysis))
+        return self.index.search(query, k)
+
+    def top_k(self, message: str, analysis: Dict[str, str] = None, k: int = 5,
+              semantic: bool = False) -> List[Tuple[Dict, float]]:
+        """Rank all verses by relevance to the message and detected topic"""
+        if semantic:
+            return self.semantic_top_k([semantic_query(message, analysis)], k)[0]
+
+        return [(self.verses[position], score) for position, score in self._rank(message, analysis, k)]
 
-    def find(self, analysis: Dict[str, str]) -> Dict[str, str]:
+    def semantic_top_k(self, messages: List[str], k: int = 5) -> List[List[Tuple[Dict, float]]]:
+        """Cosine top-k for a batch of messages, scored with a single matrix multiply"""
+        return [
+            [(self.verses[position], score) for position, score in hits]
+            for hits in self._semantic_rank(messages, k)
+        ]
+
+    def _semantic_rank(self, messages: List[str], k: int) -> List[List[Tuple[int, float]]]:
+        if self.embeddings is None:
+            raise RuntimeError("VerseFinder was created without verse embeddings")
+        return self.embeddings.search(messages, k)
+
+    def _choose(self, ranked: List[Tuple[int, float]], topic: str, session_id: Optional[str]) -> Dict:
+        """Best candidate after the repeat penalty, recorded as seen by the session"""
+        if self.seen is None or not session_id:
+            return self.verses[self._best(ranked, topic)]
+        # find_many runs in the agent pool while /chat runs on the loop; one session's picks must not interleave
+        with self.seen.locked():
+            bits = self.seen.get(session_id)
+            seen = [SeenVerses.contains(bits, position) for position, _ in ranked]
+            if ranked and all(seen):
+                # Every candidate has been shown: go round them again in relevance order
+                self.seen.clear(session_id, [position for position, _ in ranked])
+            else:
+                ranked = [
+                    (position, score * SEEN_PENALTY if was_seen else score)
+                    for (position, score), was_seen in zip(ranked, seen)
+                ]
+            position = self._best(ranked, topic)
+            self.seen.mark(session_id, position)
+        return self.verses[position]
+
+    def _best(self, ranked: List[Tuple[int, float]], topic: str) -> int:
+        if ranked:
+            # max() keeps the first of equal scores, i.e. the index's own order
+            return max(ranked, key=lambda hit: hit[1])[0]
+        return self._fallback(topic)
+
+    def find(self, analysis: Dict[str, str], message: str = "", semantic: bool = False,
+             session_id: Optional[str] = None) -> Dict:
+        """Most relevant verse, preferring ones the session hasn't been shown yet"""
         topic = analysis.get("topic", "duty")
 
-        verse = self.gita_data.get(topic, self.gita_data.get("duty"))
+        # Repeat avoidance rescores a fixed number of candidates, so the cost doesn't grow with the session
+        k = CANDIDATES if self.seen is not None and session_id else 1
+        if semantic:
+            ranked = self._semantic_rank([semantic_query(message, analysis)], k)[0]
+        else:
+            ranked = self._rank(message, analysis, k)
+        verse = self._choose(ranked, topic, session_id)
 
-        print(f"[MCP Tool] Verse Finder: Found BG {verse['chapter']}.{verse['verse_num']} for topic: {topic}")
+        logger.info("[MCP Tool] Verse Finder: Found BG %s.%s for topic: %s", verse['chapter'], verse['verse_num'], topic)
 
         return verse
+
+    def find_many(self, analyses: List[Dict[str, str]], messages: List[str], semantic: bool = False,
+                  session_ids: Optional[List[Optional[str]]] = None) -> List[Dict]:
+        """find() for a batch; semantic mode scores every message with one matrix multiply
+
+        Items are chosen in order, so messages of one session within the batch
+        avoid each other's verses too.
+        """
+        session_ids = session_ids or [None] * len(messages)
+        k = CANDIDATES if self.seen is not None and any(session_ids) else 1
+        if semantic:
+            queries = [semantic_query(message, analysis) for message, analysis in zip(messages, analyses)]
+            ranked = self._semantic_rank(queries, k)
+        else:
+            ranked = [self._rank(message, analysis, k) for message, analysis in zip(messages, analyses)]
+
+        verses = [
+            self._choose(hits, analysis.get("topic", "duty"), session_id)
+            for hits, analysis, session_id in zip(ranked, analyses, session_ids)
+        ]
+        logger.info("[MCP Tool] Verse Finder: Found verses for a batch of %d messages", len(verses))
+        return verses
+
+    def forget(self, session_id: str):
+        """Drop a session's seen verses"""
+        if self.seen is not None:
+            self.seen.pop(session_id)
+
+    def _fallback(self, topic: str) -> int:
+        """Position of the curated topic verse, for when nothing in the index matches"""
+        verse_ids = self.topics.get(topic) or self.topics.get("duty") or []
+        for verse_id in verse_ids:
+            if verse_id in self.corpus.positions_by_id:
+                return self.corpus.positions_by_id[verse_id]
+        return 0
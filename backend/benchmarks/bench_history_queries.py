@@ -0,0 +1,111 @@
+"""
+Benchmark: history and /metrics queries before and after the schema migrations
+
+Builds a legacy-schema database (ISO text timestamps, no indexes, COUNT(*)
+for metrics), times the hot queries, applies the migrations in place and
+times the same queries again.
+
+Run from backend/:  python -m benchmarks.bench_history_queries [--rows 1000000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+from database import MIGRATIONS
+from utils.session_state import SQL_FUNCTIONS
+
+LEGACY_HISTORY_SQL = '''
+    SELECT user_message, krishna_response, topic, emotion, timestamp
+    FROM interactions WHERE session_id = ? ORDER BY timestamp DESC LIMIT 10
+'''
+HISTORY_SQL = '''
+    SELECT user_message, krishna_response, topic, emotion, timestamp
+    FROM interactions WHERE session_id = ? ORDER BY timestamp DESC, id DESC LIMIT 10
+'''
+
+
+def populate(conn: sqlite3.Connection, rows: int, sessions: int):
+    """Fill the legacy schema with `rows` interactions spread over `sessions` sessions"""
+    conn.execute('BEGIN')
+    for sql in MIGRATIONS[0][1]:
+        conn.execute(sql)
+
+    start = datetime(2025, 1, 1)
+    conn.executemany(
+        'INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (
+            (f"s{i}", f"u{i}", '["fear"]', 'fearful', rows // sessions,
+             start.isoformat(), (start + timedelta(days=1)).isoformat())
+            for i in range(sessions)
+        ),
+    )
+    rng = random.Random(7)
+    conn.executemany(
+        '''INSERT INTO interactions
+           (session_id, user_message, krishna_response, topic, emotion, verse_reference, timestamp)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        (
+            (f"s{rng.randrange(sessions)}", "I feel anxious about my work", "Dear friend, " + "x" * 400,
+             "fear", "fearful", "BG 2.47", (start + timedelta(seconds=i)).isoformat())
+            for i in range(rows)
+        ),
+    )
+    conn.execute('COMMIT')
+
+
+def timed(fn: Callable[[], None], repeat: int) -> float:
+    """Mean milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(conn: sqlite3.Connection, history_sql: str, count_sql: str, sessions: int) -> Dict[str, float]:
+    rng = random.Random(11)
+    return {
+        "history_ms": round(timed(lambda: conn.execute(history_sql, (f"s{rng.randrange(sessions)}",)).fetchall(), 50), 3),
+        "count_ms": round(timed(lambda: conn.execute(count_sql).fetchone(), 10), 3),
+    }
+
+
+def run(rows: int = 1_000_000, sessions: int = 10_000) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"), isolation_level=None)
+        for name, nargs, func in SQL_FUNCTIONS:
+            conn.create_function(name, nargs, func, deterministic=True)
+        populate(conn, rows, sessions)
+
+        before = measure(conn, LEGACY_HISTORY_SQL, 'SELECT COUNT(*) FROM interactions', sessions)
+
+        start = time.perf_counter()
+        for _, statements in MIGRATIONS[1:]:
+            conn.execute('BEGIN')
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute('COMMIT')
+        migrate_s = time.perf_counter() - start
+
+        after = measure(conn, HISTORY_SQL, "SELECT value FROM counters WHERE name = 'interactions'", sessions)
+        conn.close()
+
+    return {"rows": rows, "migration_s": round(migrate_s, 2), "before": before, "after": after}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    args = parser.parse_args()
+
+    result = run(args.rows, args.sessions)
+    print(f"rows={result['rows']}  migration={result['migration_s']}s")
+    print(f"{'query':<10} {'before (ms)':>12} {'after (ms)':>12}")
+    for key, label in (("history_ms", "history"), ("count_ms", "count")):
+        print(f"{label:<10} {result['before'][key]:>12} {result['after'][key]:>12}")
@@ -0,0 +1,77 @@
+"""
+Microbenchmark: VerseIndex lookup latency as the corpus grows
+
+Run from backend/:  python -m benchmarks.bench_verse_index
+"""
+
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from tools.verse_index import VerseIndex
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "bhagvad_gita.json"
+
+QUERIES = [
+    "I am confused about my career choice",
+    "I feel afraid and worried about the future",
+    "What is my duty towards my family",
+    "I cannot let go of this relationship",
+    "I want to learn and understand wisdom",
+    "Work stress is overwhelming me, I need peace",
+]
+
+
+def synthesize_corpus(seed_verses: List[Dict], size: int, rng: random.Random) -> List[Dict]:
+    """Grow the real verses into a corpus of `size` by reshuffling their fields"""
+    vocabulary = sorted({
+        word
+        for verse in seed_verses
+        for word in verse["translation"].lower().split()
+    })
+    corpus = []
+    for i in range(size):
+        base = seed_verses[i % len(seed_verses)]
+        corpus.append({
+            "id": i + 1,
+            "chapter": 1 + i % 18,
+            "verse_num": 1 + i // 18,
+            "translation": " ".join(rng.choices(vocabulary, k=30)),
+            "topic": rng.sample(base["topic"], k=min(2, len(base["topic"]))),
+            "keywords": rng.sample(base["keywords"], k=min(4, len(base["keywords"]))),
+            "context": base["context"],
+        })
+    return corpus
+
+
+def run(sizes=(10, 100, 700, 7_000, 70_000), lookups: int = 2_000, k: int = 5) -> List[Dict]:
+    with open(DATA_PATH, "r") as f:
+        seed_verses = json.load(f)["verses"]
+
+    rng = random.Random(42)
+    queries = [VerseIndex.build_query([text], {"fear": 2.0}) for text in QUERIES]
+    results = []
+
+    for size in sizes:
+        corpus = synthesize_corpus(seed_verses, size, rng)
+
+        start = time.perf_counter()
+        index = VerseIndex(corpus)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for i in range(lookups):
+            index.search(queries[i % len(queries)], k)
+        lookup_us = (time.perf_counter() - start) / lookups * 1_000_000
+
+        results.append({"verses": size, "build_ms": round(build_ms, 2), "lookup_us": round(lookup_us, 2)})
+
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'verses':>8} {'build (ms)':>12} {'lookup (us)':>12}")
+    for row in run():
+        print(f"{row['verses']:>8} {row['build_ms']:>12} {row['lookup_us']:>12}")
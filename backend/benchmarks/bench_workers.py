@@ -0,0 +1,155 @@
+"""
+Load test: /chat throughput as the number of uvicorn workers grows
+
+Starts `serve.py --workers N` against a scratch database for each N, drives
+it with concurrent HTTP clients for a fixed duration and reports requests
+per second and latency percentiles. Throughput should grow roughly linearly
+with N until the worker count reaches the number of cores.
+
+Run from backend/:  python -m benchmarks.bench_workers [--workers 1 2 4] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+MESSAGES = [
+    "I am confused about my career choice",
+    "I feel afraid and worried about the future",
+    "What is my duty towards my family",
+    "I cannot let go of this relationship",
+    "Work stress is overwhelming me, I need peace",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, scratch: str, clients: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DATABASE_PATH=os.path.join(scratch, f"bench_{workers}.db"),
+        LOG_FILE=os.path.join(scratch, f"bench_{workers}.log"),
+        # Measure the pipeline, not shedding: every client may queue, none is rate-limited
+        RATE_LIMIT_PER_MINUTE="1e9",
+        RATE_LIMIT_BURST="1e9",
+        MAX_QUEUED_CHATS=str(clients),
+        ADMISSION_MAX_WAIT_S="inf",
+    )
+    return subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+async def drive(base_url: str, clients: int, duration: float) -> Dict:
+    """Each client is one user holding a session and chatting in a loop"""
+    latencies: List[float] = []
+    errors = 0
+    rejected = 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as http:
+        deadline = time.monotonic() + duration
+
+        async def user(n: int):
+            nonlocal errors, rejected
+            session_id = None
+            turn = 0
+            while time.monotonic() < deadline:
+                payload = {"user_id": f"user-{n}", "message": MESSAGES[(n + turn) % len(MESSAGES)],
+                           "session_id": session_id}
+                start = time.perf_counter()
+                try:
+                    response = await http.post("/chat", json=payload)
+                    if response.status_code == 429:
+                        rejected += 1
+                    response.raise_for_status()
+                    session_id = response.json()["session_id"]
+                    latencies.append((time.perf_counter() - start) * 1000)
+                except httpx.HTTPError:
+                    errors += 1
+                turn += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    if rejected:
+        # Shed requests would make the numbers measure admission control instead of throughput
+        raise RuntimeError(f"{rejected} requests were rejected with 429; the server's limits were not lifted")
+
+    latencies.sort()
+
+    def pct(q: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2) if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+    }
+
+
+def run(worker_counts=(1, 2, 4), clients: int = 64, duration: float = 10.0) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for workers in worker_counts:
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = start_server(workers, port, scratch, clients)
+            try:
+                asyncio.run(wait_ready(base_url))
+                row = asyncio.run(drive(base_url, clients, duration))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            results.append({"workers": workers, **row})
+
+    baseline = results[0]["rps"] or 1
+    for row in results:
+        row["speedup"] = round(row["rps"] / baseline, 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'p50 (ms)':>10} {'p99 (ms)':>10} {'errors':>7}")
+    for row in run(args.workers, args.clients, args.duration):
+        print(f"{row['workers']:>8} {row['rps']:>10} {row['speedup']:>8} "
+              f"{row['p50_ms']:>10} {row['p99_ms']:>10} {row['errors']:>7}")
@@ -0,0 +1,120 @@
+"""
+Regression check: InputAnalyzer labels against the original rule chain
+
+The original analyzer ran one re.search per rule, in priority order, and
+returned the first rule that matched anywhere in the message. The scorer
+keeps that recall: whenever exactly one rule matches, it must pick the same
+topic and category, and when none does, the same duty/general default. With
+several rules present it deliberately differs. It picks the topic with the
+most (weighted) keyword hits, and only breaks ties by rule order. Those
+messages are counted but not failed.
+
+Run from backend/:  python -m benchmarks.check_analyzer [--show 10]
+"""
+
+import argparse
+import itertools
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from agents.analyzer import RULES, InputAnalyzer
+
+# The rule chain as it was before the scorer: (topic, category, pattern)
+BASELINE_RULES = [
+    ("confusion", "life_decision", r"career|job|work|profession|confusion|choice"),
+    ("fear", "emotional", r"fear|afraid|scared|worry|anxious"),
+    ("duty", "dharma", r"duty|responsibility|should|must|obligation"),
+    ("attachment", "spiritual", r"attached|attachment|let go|holding"),
+    ("knowledge", "learning", r"learn|knowledge|wisdom|understand"),
+    ("peace", "emotional", r"stress|peace|calm|overwhelm"),
+]
+
+SENTENCES = [
+    "I am confused about my career choice",
+    "I feel afraid and worried about the future",
+    "What is my duty towards my family",
+    "I cannot let go of this relationship",
+    "Work stress is overwhelming me, I need peace",
+    "I am angry at my brother and can't forgive him",
+    "What is the purpose of my life?",
+    "I feel lonely since I moved to a new city",
+    "I am overworked and my homework is killing me",
+    "I misunderstand everything",
+    "My coworkers are stressful and I am stressed out",
+    "I am not afraid of anything anymore",
+    "I am so very scared of failing",
+    "I keep holding on to old grudges",
+    "Our jobless summer left me fearful",
+    "My professional life is a mess",
+    "I wonder what I should do",
+    "The unlearning is the hardest part",
+    "Everything feels calmer now, thank you",
+    "Nobody understands me",
+    "I am terrified and exhausted",
+    "I miss my grandmother",
+    "Please dismiss my earlier question",
+    "It's intense lately",
+    "Hello Krishna",
+    "Why do bad things happen to good people?",
+]
+
+# Keyword contexts: whole word, inside a longer word, and after modifiers
+CONTEXTS = [
+    "I think about {} a lot",
+    "so much over{}ed lately",
+    "my {}s are piling up",
+    "I am not {} at all",
+    "I am really {}",
+    "un{}ness everywhere",
+]
+FILLERS = ["Tell me a story", "What should I eat", "My cat sleeps all day"]
+
+
+def baseline_matches(message: str) -> List[Tuple[str, str]]:
+    """Every (topic, category) whose original pattern matches, in rule order"""
+    text = message.lower()
+    return [(topic, category) for topic, category, pattern in BASELINE_RULES if re.search(pattern, text)]
+
+
+def corpus() -> List[str]:
+    """Hand-written sentences, each keyword in every context, and keyword pairs"""
+    keywords = [word for rule in RULES for word in rule[3]]
+    messages = list(SENTENCES) + list(FILLERS)
+    messages += [context.format(word) for word in keywords for context in CONTEXTS]
+    messages += [f"{a} and {b}" for a, b in itertools.permutations(keywords, 2)]
+    return messages
+
+
+def check(messages: List[str]) -> Dict:
+    analyzer = InputAnalyzer()
+    mismatches: List[Tuple[str, Tuple[str, str], Tuple[str, str]]] = []
+    counts = {"messages": len(messages), "single_rule": 0, "no_rule": 0, "multi_rule": 0, "multi_rule_differs": 0}
+    for message in messages:
+        matches = baseline_matches(message)
+        analysis = analyzer.analyze(message)
+        got = (analysis["topic"], analysis["category"])
+        if len(matches) > 1:
+            counts["multi_rule"] += 1
+            counts["multi_rule_differs"] += got != matches[0]
+            continue
+        expected: Optional[Tuple[str, str]] = matches[0] if matches else ("duty", "general")
+        counts["single_rule" if matches else "no_rule"] += 1
+        if got != expected:
+            mismatches.append((message, expected, got))
+    return {**counts, "mismatches": mismatches}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--show", type=int, default=10, help="Mismatches to print")
+    args = parser.parse_args()
+
+    result = check(corpus())
+    mismatches = result.pop("mismatches")
+    for key, value in result.items():
+        print(f"{key:>20}: {value}")
+    print(f"{'mismatches':>20}: {len(mismatches)}")
+    for message, expected, got in mismatches[:args.show]:
+        print(f"  {message!r}: expected {expected[0]}/{expected[1]}, got {got[0]}/{got[1]}")
+    sys.exit(1 if mismatches else 0)
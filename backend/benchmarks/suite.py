@@ -0,0 +1,386 @@
+"""
+Benchmark suite: agent microbenchmarks, database operations and in-process /chat load
+
+Levels (pick with --levels; micro, db and load run by default):
+  micro       InputAnalyzer.analyze, VerseFinder.find (keyword and semantic),
+              KrishnaAI.generate, ActionSuggester.suggest
+  db          Database.save_interaction (buffered, then flushed) and
+              get_session_history against a table of --rows interactions
+  load        --users concurrent synthetic users driving main.app through an
+              in-process ASGI transport; throughput and tail latency
+  index       bench_verse_index (lookup latency as the corpus grows)
+  migrations  bench_history_queries (hot queries before/after the migrations)
+  workers     bench_workers (multi-process HTTP throughput; starts servers)
+
+Every run writes one JSON document: run metadata plus a flat map of
+benchmark name -> metrics. Compare two runs to catch regressions; metrics
+ending in _us/_ms/_s are lower-is-better, rps/ops_per_s higher-is-better.
+
+Run from backend/:
+    python -m benchmarks.suite [--levels micro db load] [--quick] [--output results.json]
+    python -m benchmarks.suite --compare baseline.json results.json [--threshold 0.10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+LEVELS = ("micro", "db", "load", "index", "migrations", "workers")
+DEFAULT_LEVELS = ("micro", "db", "load")
+
+MESSAGES = [
+    "I am confused about my career choice",
+    "I feel afraid and worried about the future",
+    "What is my duty towards my family",
+    "I cannot let go of this relationship",
+    "Work stress is overwhelming me, I need peace",
+    "I am angry at my brother and can't forgive him",
+    "What is the purpose of my life?",
+    "I feel lonely since I moved to a new city",
+]
+
+LOWER_IS_BETTER = ("_us", "_ms", "_s")
+HIGHER_IS_BETTER = ("rps", "ops_per_s", "speedup")
+
+
+def percentiles(samples: List[float], scale: float = 1.0) -> Dict[str, float]:
+    """mean/p50/p95/p99 of samples (seconds), multiplied by scale"""
+    samples = sorted(samples)
+
+    def pct(q: float) -> float:
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * scale, 2)
+
+    return {
+        "mean": round(sum(samples) / len(samples) * scale, 2),
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+    }
+
+
+def time_calls(fn: Callable, inputs: Sequence, iterations: int, warmup: int = 100) -> Dict[str, float]:
+    """Per-call latency of fn over inputs, cycled, in microseconds"""
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    samples = []
+    clock = time.perf_counter
+    for i in range(iterations):
+        arg = inputs[i % len(inputs)]
+        start = clock()
+        fn(arg)
+        samples.append(clock() - start)
+    return {f"{key}_us": value for key, value in percentiles(samples, 1e6).items()} | {"calls": iterations}
+
+
+# ==================== MICRO ====================
+
+def bench_micro(iterations: int) -> Dict[str, Dict]:
+    from agents.action_suggester import ActionSuggester
+    from agents.analyzer import InputAnalyzer
+    from agents.krishna_ai import KrishnaAI
+    from agents.verse_finder import VerseFinder
+    from config import GITA_CORPUS_PATH, GITA_DATA_PATH, VERSE_EMBEDDING_DIM, VERSE_EMBEDDINGS_PATH
+    from tools.verse_corpus import VerseCorpus
+    from tools.verse_embeddings import VerseEmbeddings
+
+    corpus = VerseCorpus.load_or_build(GITA_DATA_PATH, GITA_CORPUS_PATH)
+    embeddings = VerseEmbeddings.load_or_build(corpus.verses, VERSE_EMBEDDINGS_PATH, VERSE_EMBEDDING_DIM)
+    analyzer = InputAnalyzer()
+    finder = VerseFinder(corpus, embeddings)
+    krishna = KrishnaAI(seed=0)
+    suggester = ActionSuggester()
+
+    analyses = [analyzer.analyze(message) for message in MESSAGES]
+    turns = [(message, analysis, finder.find(analysis, message)) for message, analysis in zip(MESSAGES, analyses)]
+
+    return {
+        "micro.analyze": time_calls(analyzer.analyze, MESSAGES, iterations),
+        "micro.find": time_calls(lambda t: finder.find(t[1], t[0]), turns, iterations),
+        "micro.find_semantic": time_calls(lambda t: finder.find(t[1], t[0], semantic=True), turns, iterations),
+        "micro.generate": time_calls(lambda t: krishna.generate(t[0], t[2], t[1], []), turns, iterations),
+        "micro.suggest": time_calls(suggester.suggest, analyses, iterations),
+    }
+
+
+# ==================== DB ====================
+
+async def _populate(db, rows: int, sessions: int, chunk: int = 20_000):
+    """Fill sessions and interactions through save_batch, newest activity last"""
+    rng = random.Random(7)
+    start_ms = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    new_sessions = [
+        (f"s{i}", f"u{i}", 'fearful', start_ms, start_ms) for i in range(sessions)
+    ]
+    await db.save_batch(new_sessions, [], {})
+    for offset in range(0, rows, chunk):
+        interactions = [
+            {
+                'session_id': f"s{rng.randrange(sessions)}",
+                'user_message': MESSAGES[i % len(MESSAGES)],
+                'krishna_response': "Dear friend, " + "x" * 400,
+                'topic': 'fear', 'emotion': 'fearful', 'verse_reference': 'BG 2.47',
+                'timestamp': start_ms + i * 1000,
+            }
+            for i in range(offset, min(rows, offset + chunk))
+        ]
+        await db.save_batch([], interactions, {})
+
+
+async def _bench_db(path: str, rows: int, sessions: int, operations: int) -> Dict[str, Dict]:
+    from database import Database, now_ms
+
+    db = Database(path)
+    await db.initialize()
+    try:
+        start = time.perf_counter()
+        await _populate(db, rows, sessions)
+        populate_s = time.perf_counter() - start
+
+        # save_interaction returns once buffered; the flusher commits in batches behind it
+        samples = []
+        start = time.perf_counter()
+        for i in range(operations):
+            interaction = {
+                'session_id': f"s{i % sessions}", 'user_message': MESSAGES[i % len(MESSAGES)],
+                'krishna_response': "Dear friend, " + "x" * 400, 'topic': 'fear', 'emotion': 'fearful',
+                'verse_reference': 'BG 2.47', 'timestamp': now_ms(),
+            }
+            call = time.perf_counter()
+            await db.save_interaction(interaction)
+            samples.append(time.perf_counter() - call)
+        await db.flush()
+        elapsed = time.perf_counter() - start
+        save = {f"{key}_us": value for key, value in percentiles(samples, 1e6).items()}
+        save["ops_per_s"] = round(operations / elapsed, 1)
+
+        rng = random.Random(11)
+        samples = []
+        start = time.perf_counter()
+        for _ in range(operations):
+            call = time.perf_counter()
+            await db.get_session_history(f"s{rng.randrange(sessions)}")
+            samples.append(time.perf_counter() - call)
+        elapsed = time.perf_counter() - start
+        history = {f"{key}_us": value for key, value in percentiles(samples, 1e6).items()}
+        history["ops_per_s"] = round(operations / elapsed, 1)
+    finally:
+        await db.close()
+
+    return {
+        "db.populate": {"rows": rows, "sessions": sessions, "populate_s": round(populate_s, 2)},
+        "db.save_interaction": save,
+        "db.get_session_history": history,
+    }
+
+
+def bench_db(rows: int, sessions: int, operations: int) -> Dict[str, Dict]:
+    with tempfile.TemporaryDirectory() as scratch:
+        return asyncio.run(_bench_db(os.path.join(scratch, "bench.db"), rows, sessions, operations))
+
+
+# ==================== LOAD ====================
+
+async def _drive(app, users: int, turns: int) -> Dict:
+    """Each user opens a session and chats `turns` times, all users at once"""
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    transport = httpx.ASGITransport(app=app)
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as http:
+
+            async def user(n: int):
+                nonlocal errors
+                session_id = None
+                for turn in range(turns):
+                    payload = {"user_id": f"user-{n}", "message": MESSAGES[(n + turn) % len(MESSAGES)],
+                               "session_id": session_id}
+                    start = time.perf_counter()
+                    response = await http.post("/chat", json=payload)
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - start)
+                    session_id = response.json()["session_id"]
+
+            started = time.perf_counter()
+            await asyncio.gather(*(user(n) for n in range(users)))
+            elapsed = time.perf_counter() - started
+
+    result = {f"{key}_ms": value for key, value in percentiles(latencies, 1e3).items()} if latencies else {}
+    return {"users": users, "requests": len(latencies), "errors": errors,
+            "rps": round(len(latencies) / elapsed, 1), **result}
+
+
+def bench_load(users: int, turns: int) -> Dict[str, Dict]:
+    """Drive main.app in-process (generator and server share the loop); run() points it at scratch files"""
+    import main
+
+    # Measure the pipeline, not shedding: every synthetic user may queue, none is rate-limited
+    main.admission.max_waiting = users
+    main.admission.max_wait_s = float("inf")
+    main.rate_limiter.burst = float(turns)
+    return {"load.chat": asyncio.run(_drive(main.app, users, turns))}
+
+
+# ==================== EXISTING BENCHMARKS ====================
+
+def bench_index(quick: bool) -> Dict[str, Dict]:
+    from benchmarks import bench_verse_index
+
+    sizes = (700, 7_000) if quick else (10, 100, 700, 7_000, 70_000)
+    return {f"index.verses_{row.pop('verses')}": row for row in bench_verse_index.run(sizes)}
+
+
+def bench_migrations(quick: bool) -> Dict[str, Dict]:
+    from benchmarks import bench_history_queries
+
+    result = bench_history_queries.run(100_000 if quick else 1_000_000, 10_000)
+    return {
+        "migrations.apply": {"rows": result["rows"], "migration_s": result["migration_s"]},
+        "migrations.before": result["before"],
+        "migrations.after": result["after"],
+    }
+
+
+def bench_workers(quick: bool) -> Dict[str, Dict]:
+    from benchmarks import bench_workers as workers
+
+    rows = workers.run((1, 2), duration=5.0) if quick else workers.run()
+    return {f"workers.{row.pop('workers')}": row for row in rows}
+
+
+# ==================== RUN / COMPARE ====================
+
+def metadata(args: argparse.Namespace) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+    }
+
+
+def run(args: argparse.Namespace) -> Dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        # config reads these at first import; nothing here may touch the real database
+        os.environ.update(
+            DATABASE_PATH=os.path.join(scratch, "load.db"),
+            LOG_FILE=os.path.join(scratch, "load.log"),
+            SESSION_ARCHIVE_DIR=os.path.join(scratch, "archive"),
+            ANALYTICS_DIR=os.path.join(scratch, "analytics"),
+        )
+        results = run_levels(args)
+    return {"meta": metadata(args), "results": results}
+
+
+def run_levels(args: argparse.Namespace) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    for level in args.levels:
+        started = time.perf_counter()
+        if level == "micro":
+            results.update(bench_micro(args.iterations))
+        elif level == "db":
+            results.update(bench_db(args.rows, args.sessions, args.operations))
+        elif level == "load":
+            results.update(bench_load(args.users, args.turns))
+        elif level == "index":
+            results.update(bench_index(args.quick))
+        elif level == "migrations":
+            results.update(bench_migrations(args.quick))
+        elif level == "workers":
+            results.update(bench_workers(args.quick))
+        print(f"[{level}] done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return results
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Dict]:
+    """Per-metric changes between two runs; `regression` marks changes past threshold in the bad direction"""
+    rows = []
+    for name, metrics in current["results"].items():
+        before = baseline["results"].get(name, {})
+        for metric, value in metrics.items():
+            old = before.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            if metric.endswith(LOWER_IS_BETTER):
+                regression = change > threshold
+            elif metric.endswith(HIGHER_IS_BETTER):
+                regression = change < -threshold
+            else:
+                continue
+            rows.append({"benchmark": name, "metric": metric, "before": old, "after": value,
+                         "change": round(change, 4), "regression": regression})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", nargs="+", choices=LEVELS, default=list(DEFAULT_LEVELS))
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast smoke run")
+    parser.add_argument("--iterations", type=int, help="calls per microbenchmark")
+    parser.add_argument("--rows", type=int, help="interactions in the db benchmark table")
+    parser.add_argument("--sessions", type=int, help="sessions the rows are spread over")
+    parser.add_argument("--operations", type=int, help="save/history calls in the db benchmarks")
+    parser.add_argument("--users", type=int, help="concurrent users in the load benchmark")
+    parser.add_argument("--turns", type=int, help="messages per user in the load benchmark")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="diff two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        print(f"{'benchmark':<28} {'metric':<12} {'before':>12} {'after':>12} {'change':>8}")
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['benchmark']:<28} {row['metric']:<12} {row['before']:>12} {row['after']:>12} "
+                  f"{row['change']:>+8.1%}{flag}")
+        return 1 if any(row["regression"] for row in rows) else 0
+
+    defaults = {
+        "iterations": (2_000, 20_000), "rows": (20_000, 500_000), "sessions": (2_000, 50_000),
+        "operations": (1_000, 10_000), "users": (200, 2_000), "turns": (3, 5),
+    }
+    for key, (quick, full) in defaults.items():
+        if getattr(args, key) is None:
+            setattr(args, key, quick if args.quick else full)
+
+    document = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(document + "\n")
+    else:
+        print(document)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
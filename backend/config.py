@@ -7,24 +7,88 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# # API Keys (for production LLM integration)
-# OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+# Data files resolve against this directory, not the process's working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# API Keys (for production LLM integration)
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 # ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY', '')
 
 # Database
-DATABASE_PATH = 'krishna_ai.db'
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'krishna_ai.db')
+DB_POOL_SIZE = 4  # Reader connections; writes go through one writer
+DB_WRITE_QUEUE_SIZE = 1000
+DB_BUSY_TIMEOUT_MS = 5000
+
+# Write-behind batching for interactions and session updates
+WRITE_BATCH_SIZE = 100  # Flush once this many writes are buffered
+WRITE_FLUSH_INTERVAL_MS = 50  # ...or after this long, whichever comes first
+WRITE_BUFFER_MAX = 5000  # Callers wait on a flush beyond this
+FLUSH_MAX_ATTEMPTS = 3  # Failed flushes of a batch before its bad rows are isolated into dead_letters
+
+# Data
+GITA_DATA_PATH = os.path.join(BASE_DIR, 'data', 'bhagvad_gita.json')
+GITA_CORPUS_PATH = os.path.join(BASE_DIR, 'data', 'bhagvad_gita.bin')  # Compiled by tools.verse_corpus
 
 # Server
 HOST = '0.0.0.0'
 PORT = 8000
+# Worker processes serving the app; serve.py exports this to its workers
+WORKERS = int(os.getenv('WORKERS', '1'))
 
 # Logging
-LOG_FILE = 'krishna_ai.log'
+LOG_FILE = os.getenv('LOG_FILE', 'krishna_ai.log')
 LOG_LEVEL = 'INFO'
+LOG_QUEUE_SIZE = 10000  # Records beyond this are dropped and counted
+LOG_BATCH_SIZE = 256  # Records written per batch by the log thread
 
 # Agent Settings
 MAX_CONVERSATION_HISTORY = 10
-SESSION_TIMEOUT_HOURS = 24
+RECENT_TURNS_IN_CONTEXT = 3  # Full turns sent with the rolling summary on each request
+SESSION_SUMMARY_PATH_LENGTH = 8  # Topic/emotion trajectory segments kept per session
+EMOTION_TREND_DECAY = 0.7  # Share of the session emotion trend carried into each new turn
+SESSION_TIMEOUT_HOURS = 24  # Idle sessions are archived and deleted after this
+SESSION_EXPIRY_INTERVAL_S = 300  # How often the expiry task looks for idle sessions
+SESSION_EXPIRY_BATCH_SIZE = 200  # Sessions archived per segment / delete transaction
+SESSION_ARCHIVE_DIR = os.getenv('SESSION_ARCHIVE_DIR', 'archive')  # Compressed NDJSON segments
+INCREMENTAL_VACUUM_PAGES = 2000  # Free pages released after each expiry pass
+ANALYTICS_DIR = os.getenv('ANALYTICS_DIR', 'analytics')  # Parquet copies of interactions
+ANALYTICS_EXPORT_INTERVAL_S = 60  # How often new interactions are exported
+ANALYTICS_EXPORT_BATCH_ROWS = 100000  # Rows read and written per export file
+ANALYTICS_COMPACT_TARGET_ROWS = 1000000  # Small export files are merged up to this size
+AGENT_THREAD_POOL_SIZE = 4  # Threads for CPU-bound agent stages
+BATCH_CHAT_CHUNK_SIZE = 500  # /chat/batch messages processed and committed per transaction
+MAX_BATCH_ITEMS = 5000  # Larger /chat/batch requests get 422; each chunk costs its users one rate-limit token
+
+# Admission control for /chat and /chat/stream (per process; the rate is split across workers)
+RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', '30'))  # Sustained messages per user_id
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', '10'))  # Messages a user_id may send back to back
+MAX_ACTIVE_CHATS = 64  # Chat pipelines running at once
+MAX_QUEUED_CHATS = int(os.getenv('MAX_QUEUED_CHATS', '256'))  # Requests waiting for a pipeline; beyond this they get 429
+ADMISSION_MAX_WAIT_S = float(os.getenv('ADMISSION_MAX_WAIT_S', '5.0'))  # Queued requests get 429 after waiting this long
+
+# In-process caches (entries also expire after SESSION_TIMEOUT_HOURS idle).
+# A session's requests can land on any worker and a cached copy in one process
+# never sees writes made by another, so these caches are off with WORKERS > 1.
+SESSION_CACHE_SIZE = 10000 if WORKERS == 1 else 0
+HISTORY_CACHE_SIZE = 10000 if WORKERS == 1 else 0
+RESPONSE_MEMO_SIZE = 4096  # Rendered templates per (topic, verse, variant); safe per process
+RESPONSE_CACHE_BYTES = 32 * 1024 * 1024  # Generated responses keyed by message, analysis and verse
+RESPONSE_CACHE_MIN_SIMILARITY = 0.8  # Word-set Jaccard at which two messages share a response
+# Verses shown per session, one bit per verse; a stale or missing copy only risks a repeat, so kept per process
+SEEN_VERSES_SESSIONS = 10000
+
+# LLM generation (any OpenAI-compatible completions server); empty URL = templates only
+LLM_BASE_URL = os.getenv('LLM_BASE_URL', '')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-3.5-turbo-instruct')
+LLM_MAX_TOKENS = 400
+LLM_TIMEOUT_S = 8.0  # Per response; templates are used past this
+LLM_MAX_CONCURRENCY = 8  # In-flight HTTP requests per process
+LLM_BATCH_SIZE = 16  # Prompts sent per completions request
+LLM_BATCH_WINDOW_MS = 10  # How long a prompt waits for others to batch with
+LLM_RETRY_AFTER_S = 30  # Skip the backend this long after a failure
 
 # MCP Settings
-MCP_TOOLS_ENABLED = True
\ No newline at end of file
+MCP_TOOLS_ENABLED = True
+VERSE_EMBEDDINGS_PATH = os.path.join(BASE_DIR, 'data', 'verse_embeddings.npy')
+VERSE_EMBEDDING_DIM = 1024
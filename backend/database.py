@@ -1,112 +1,589 @@
 """
 SQLite Database for session management and memory
+Async access through aiosqlite: a bounded pool of reader connections and a
+single writer connection fed by a queue, with the database in WAL mode so
+reads never wait behind writes. Per-message writes are buffered and flushed
+as one transaction per batch (write-behind)
 """
 
-import sqlite3
-from typing import List, Dict, Optional
-from datetime import datetime
+import asyncio
 import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Dict, Optional, Sequence
+
+import aiosqlite
+import numpy as np
+
+from utils.logger import get_logger
+from utils.metrics import DB_LATENCY, DB_ROWS_DEAD_LETTERED, DB_ROWS_FLUSHED
+from utils.session_state import SQL_FUNCTIONS, topic_bit
+from config import (
+    DB_BUSY_TIMEOUT_MS, DB_POOL_SIZE, DB_WRITE_QUEUE_SIZE, FLUSH_MAX_ATTEMPTS,
+    WRITE_BATCH_SIZE, WRITE_BUFFER_MAX, WRITE_FLUSH_INTERVAL_MS,
+)
+
+# Epoch milliseconds, converting legacy ISO text written in local time
+_ISO_TO_MS = "COALESCE(CAST(ROUND((julianday({col}, 'utc') - 2440587.5) * 86400000) AS INTEGER), 0)"
+
+# Append-only: (description, statements). PRAGMA user_version records how many have run
+MIGRATIONS = [
+    ("base tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            topics_discussed TEXT,
+            emotional_state TEXT,
+            message_count INTEGER DEFAULT 0,
+            created_at TEXT,
+            last_activity TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT,
+            user_message TEXT,
+            krishna_response TEXT,
+            topic TEXT,
+            emotion TEXT,
+            verse_reference TEXT,
+            timestamp TEXT,
+            FOREIGN KEY (session_id) REFERENCES sessions(session_id)
+        )
+        ''',
+    ]),
+    ("integer epoch-ms timestamps", [
+        '''
+        CREATE TABLE sessions_new (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            topics_discussed TEXT,
+            emotional_state TEXT,
+            message_count INTEGER DEFAULT 0,
+            created_at INTEGER NOT NULL,
+            last_activity INTEGER NOT NULL
+        )
+        ''',
+        f'''
+        INSERT INTO sessions_new
+        SELECT session_id, user_id, topics_discussed, emotional_state, message_count,
+               {_ISO_TO_MS.format(col='created_at')}, {_ISO_TO_MS.format(col='last_activity')}
+        FROM sessions
+        ''',
+        'DROP TABLE sessions',
+        'ALTER TABLE sessions_new RENAME TO sessions',
+        '''
+        CREATE TABLE interactions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT,
+            user_message TEXT,
+            krishna_response TEXT,
+            topic TEXT,
+            emotion TEXT,
+            verse_reference TEXT,
+            timestamp INTEGER NOT NULL,
+            FOREIGN KEY (session_id) REFERENCES sessions(session_id)
+        )
+        ''',
+        f'''
+        INSERT INTO interactions_new
+        SELECT id, session_id, user_message, krishna_response, topic, emotion, verse_reference,
+               {_ISO_TO_MS.format(col='timestamp')}
+        FROM interactions
+        ''',
+        'DROP TABLE interactions',
+        'ALTER TABLE interactions_new RENAME TO interactions',
+    ]),
+    ("history and activity indexes", [
+        # History: seek to the session, walk newest-first, stop after LIMIT rows
+        'CREATE INDEX IF NOT EXISTS idx_interactions_session_ts ON interactions (session_id, timestamp)',
+        # Covers idle-session scans (last_activity range -> session_id) without touching the table
+        'CREATE INDEX IF NOT EXISTS idx_sessions_activity ON sessions (last_activity, session_id)',
+    ]),
+    ("maintained row counters", [
+        'CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID',
+        "INSERT OR REPLACE INTO counters VALUES ('interactions', (SELECT COUNT(*) FROM interactions))",
+        "INSERT OR REPLACE INTO counters VALUES ('sessions', (SELECT COUNT(*) FROM sessions))",
+        '''
+        CREATE TRIGGER IF NOT EXISTS interactions_count_insert AFTER INSERT ON interactions
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'interactions'; END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS interactions_count_delete AFTER DELETE ON interactions
+        BEGIN UPDATE counters SET value = value - 1 WHERE name = 'interactions'; END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS sessions_count_insert AFTER INSERT ON sessions
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'sessions'; END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS sessions_count_delete AFTER DELETE ON sessions
+        BEGIN UPDATE counters SET value = value - 1 WHERE name = 'sessions'; END
+        ''',
+    ]),
+    ("session trajectory", [
+        # Run-length topic/emotion path (utils.session_state); it starts with the next turn.
+        # The rest of the rolling summary is derived from message_count and topic_counts
+        'ALTER TABLE sessions ADD COLUMN path BLOB',
+    ]),
+    ("compact session state", [
+        'ALTER TABLE sessions ADD COLUMN topic_mask INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE sessions ADD COLUMN topic_counts BLOB',
+        'ALTER TABLE sessions ADD COLUMN emotion_trend BLOB',
+        # Counts come from existing history; the emotion trend starts with the next turn
+        '''
+        UPDATE sessions
+        SET topic_mask = session_topic_mask(topics_discussed),
+            topic_counts = session_topic_counts((SELECT json_group_object(topic, n) FROM (
+                SELECT topic, COUNT(*) AS n FROM interactions i
+                WHERE i.session_id = sessions.session_id GROUP BY topic)))
+        ''',
+        'ALTER TABLE sessions DROP COLUMN topics_discussed',
+    ]),
+    ("dead letters", [
+        # Buffered rows that failed on their own, kept as JSON for inspection or replay
+        '''
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            error TEXT,
+            created_at INTEGER NOT NULL
+        )
+        ''',
+    ]),
+]
+
+
+def now_ms() -> int:
+    """Current time as integer epoch milliseconds, the stored timestamp format"""
+    return int(time.time() * 1000)
+
+
+def ms_to_iso(ms: int) -> str:
+    """Stored timestamp back to the ISO string the API returns"""
+    return datetime.fromtimestamp(ms / 1000).isoformat()
+
+
+logger = get_logger("database")
+
+INSERT_SESSION_SQL = '''
+    INSERT INTO sessions
+    (session_id, user_id, emotional_state, created_at, last_activity)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+INSERT_INTERACTION_SQL = '''
+    INSERT INTO interactions
+    (session_id, user_message, krishna_response, topic, emotion, verse_reference, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# One turn folded into the session row in place (functions from utils.session_state),
+# so concurrent writers never lose each other's turns
+APPLY_TURN_SQL = '''
+    UPDATE sessions
+    SET topic_mask = topic_mask | ?,
+        topic_counts = session_count_topic(topic_counts, ?),
+        emotion_trend = session_decay_emotions(emotion_trend, ?),
+        path = session_fold_path(path, ?, ?),
+        emotional_state = ?,
+        message_count = message_count + 1,
+        last_activity = ?
+    WHERE session_id = ?
+'''
+
+
+async def _write_rows(conn: aiosqlite.Connection, interactions: List[Dict], sessions: Dict[str, List[Dict]]):
+    """Insert interactions and apply every buffered session turn in order, two statements in all"""
+    await conn.executemany(INSERT_INTERACTION_SQL, [
+        (i['session_id'], i['user_message'], i['krishna_response'], i['topic'],
+         i['emotion'], i['verse_reference'], i['timestamp'])
+        for i in interactions
+    ])
+    await conn.executemany(APPLY_TURN_SQL, [
+        (topic_bit(turn['topic']), turn['topic'], turn['emotions'], turn['topic'], turn['emotion'],
+         turn['emotion'], turn['last_activity'], session_id)
+        for session_id, turns in sessions.items()
+        for turn in turns
+    ])
+
+INSERT_DEAD_LETTER_SQL = '''
+    INSERT INTO dead_letters (kind, payload, error, created_at) VALUES (?, ?, ?, ?)
+'''
+
+
+def _dead_letter_payload(kind: str, row: Any) -> str:
+    """JSON for a buffered row: an interaction dict, or a (session_id, turns) pair"""
+    if kind == 'session':
+        session_id, turns = row
+        row = {'session_id': session_id, 'turns': [
+            {**turn, 'emotions': list(np.frombuffer(turn['emotions'], dtype=np.float32).tolist())}
+            for turn in turns
+        ]}
+    return json.dumps(row, default=str)
+
 
 class Database:
     """SQLite database for persistent storage"""
-    
-    def __init__(self, db_path: str = "krishna_ai.db"):
+
+    def __init__(self, db_path: str = "krishna_ai.db", pool_size: int = DB_POOL_SIZE,
+                 batch_size: int = WRITE_BATCH_SIZE, flush_interval_ms: int = WRITE_FLUSH_INTERVAL_MS):
         self.db_path = db_path
-        self.conn = None
-    
-    def initialize(self):
-        """Create tables if they don't exist"""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        cursor = self.conn.cursor()
-        
-        # Sessions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sessions (
-                session_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                topics_discussed TEXT,
-                emotional_state TEXT,
-                message_count INTEGER DEFAULT 0,
-                created_at TEXT,
-                last_activity TEXT
-            )
-        ''')
-        
-        # Interactions table (conversation history)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS interactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT,
-                user_message TEXT,
-                krishna_response TEXT,
-                topic TEXT,
-                emotion TEXT,
-                verse_reference TEXT,
-                timestamp TEXT,
-                FOREIGN KEY (session_id) REFERENCES sessions(session_id)
-            )
-        ''')
+        self.pool_size = pool_size
+        self.writer: Optional[aiosqlite.Connection] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+
+        # Write-behind buffer: pending rows, and the batch currently being committed
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._pending_interactions: List[Dict] = []
+        self._pending_sessions: Dict[str, List[Dict]] = {}
+        self._inflight_interactions: List[Dict] = []
+        self._inflight_sessions: Dict[str, List[Dict]] = {}
+        self._flush_wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flusher_task: Optional[asyncio.Task] = None
+        self._failed_flushes = 0
+        self._closing = False
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+        await conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+        # WAL only fsyncs at checkpoints with NORMAL; commits stay atomic
+        await conn.execute('PRAGMA synchronous = NORMAL')
+        for name, nargs, func in SQL_FUNCTIONS:
+            await conn.create_function(name, nargs, func, deterministic=True)
+        return conn
+
+    async def initialize(self):
+        """Open connections, switch to WAL and bring the schema up to date"""
+        self.writer = await self._connect()
+        # Only takes effect on a new, empty file (must precede WAL and the first table);
+        # existing files are converted with `python -m utils.session_archiver --enable-incremental-vacuum`
+        await self.writer.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        # WAL lets every worker process read while one of them writes
+        await self.writer.execute('PRAGMA journal_mode = WAL')
+
+        await self._migrate()
+
+        self._readers = asyncio.Queue(maxsize=self.pool_size)
+        for _ in range(self.pool_size):
+            self._readers.put_nowait(await self._connect())
+
+        self._write_queue = asyncio.Queue(maxsize=DB_WRITE_QUEUE_SIZE)
+        self._writer_task = asyncio.create_task(self._writer_loop())
+
+        self._flush_wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher_task = asyncio.create_task(self._flush_loop())
+        logger.info("[Database] Initialized successfully in process %d", os.getpid())
+
+    async def _migrate(self):
+        """Apply every migration newer than the file's user_version, each in its own transaction"""
+        for target in range(1, len(MIGRATIONS) + 1):
+            description, statements = MIGRATIONS[target - 1]
+            # IMMEDIATE takes the write lock before reading the version, so when
+            # several worker processes start at once only one of them migrates
+            await self.writer.execute('BEGIN IMMEDIATE')
+            try:
+                async with self.writer.execute('PRAGMA user_version') as cursor:
+                    if (await cursor.fetchone())[0] >= target:
+                        await self.writer.rollback()
+                        continue
+                for sql in statements:
+                    await self.writer.execute(sql)
+                await self.writer.execute(f'PRAGMA user_version = {target}')
+                await self.writer.commit()
+            except Exception:
+                await self.writer.rollback()
+                raise
+            logger.info("[Database] Migrated schema to v%d: %s", target, description)
+
+    # ==================== CONNECTION ACCESS ====================
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a reader connection from the pool, waiting if all are busy"""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    async def write(self, operation: Callable[[aiosqlite.Connection], Awaitable[Any]],
+                    on_commit: Optional[Callable[[], None]] = None) -> Any:
+        """Queue a write for the single writer; it runs and commits as one transaction"""
+        future = asyncio.get_running_loop().create_future()
+        with DB_LATENCY.labels("write").time():
+            await self._write_queue.put((operation, future, on_commit))
+            return await future
+
+    async def _writer_loop(self):
+        """Drain the write queue one transaction at a time"""
+        while True:
+            operation, future, on_commit = await self._write_queue.get()
+            if operation is None:
+                future.set_result(None)
+                return
+            try:
+                # Lock up front: a deferred transaction that reads before writing can
+                # fail with SQLITE_BUSY instead of waiting when another process writes
+                await self.writer.execute('BEGIN IMMEDIATE')
+                result = await operation(self.writer)
+                await self.writer.commit()
+                # Runs before any reader can resume with the newly committed rows
+                if on_commit:
+                    on_commit()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                await self.writer.rollback()
+                if not future.done():
+                    future.set_exception(e)
+
+    async def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Run a single write statement, returning the affected row count"""
+        async def operation(conn):
+            cursor = await conn.execute(sql, params)
+            return cursor.rowcount
+        return await self.write(operation)
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        with DB_LATENCY.labels("read").time():
+            async with self.reader() as conn:
+                async with conn.execute(sql, params) as cursor:
+                    return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with DB_LATENCY.labels("read").time():
+            async with self.reader() as conn:
+                async with conn.execute(sql, params) as cursor:
+                    return await cursor.fetchall()
+
+    # ==================== WRITE-BEHIND BUFFER ====================
+
+    async def _buffered(self):
+        """Wake the flusher when a batch is full; block callers once the buffer is at its cap"""
+        pending = len(self._pending_interactions) + len(self._pending_sessions)
+        if pending >= self.batch_size:
+            self._flush_wakeup.set()
+        if pending >= WRITE_BUFFER_MAX:
+            await self.flush()
+
+    async def _flush_loop(self):
+        """Flush whenever a batch fills up or the flush window elapses"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("[Database] Flush failed, will retry: %s", e)
+
+    async def flush(self):
+        """Commit every buffered interaction and session update in one transaction
+
+        A batch that keeps failing is retried up to FLUSH_MAX_ATTEMPTS times, then
+        split until the rows that fail on their own are found. Those go to the
+        dead_letters table, so the rest of the batch and later writes get through.
+        """
+        async with self._flush_lock:
+            if not self._pending_interactions and not self._pending_sessions:
+                return
+
+            interactions, self._pending_interactions = self._pending_interactions, []
+            sessions, self._pending_sessions = self._pending_sessions, {}
+            self._inflight_interactions, self._inflight_sessions = interactions, sessions
+
+            async def operation(conn):
+                await _write_rows(conn, interactions, sessions)
+
+            def on_commit():
+                self._inflight_interactions, self._inflight_sessions = [], {}
+
+            try:
+                with DB_LATENCY.labels("flush").time():
+                    await self.write(operation, on_commit)
+                self._failed_flushes = 0
+                DB_ROWS_FLUSHED.labels("interactions").inc(len(interactions))
+                DB_ROWS_FLUSHED.labels("sessions").inc(len(sessions))
+                return
+            except Exception as e:
+                self._failed_flushes += 1
+                if self._failed_flushes < FLUSH_MAX_ATTEMPTS:
+                    on_commit()
+                    self._requeue(interactions, list(sessions.items()))
+                    raise
+                logger.error("[Database] Flush failed %d times, isolating bad rows: %s", self._failed_flushes, e)
+                self._failed_flushes = 0
+
+            units = [('interaction', i) for i in interactions] + [('session', item) for item in sessions.items()]
+            unwritten = {id(row) for _, row in units}
+
+            async def attempt(group: List[tuple]) -> List[tuple]:
+                """Commit a group, halving it on failure; returns ((kind, row), error) for rows that fail alone"""
+                group_interactions = [row for kind, row in group if kind == 'interaction']
+                group_sessions = dict(row for kind, row in group if kind == 'session')
+                try:
+                    await self.write(lambda conn: _write_rows(conn, group_interactions, group_sessions))
+                except Exception as e:
+                    if len(group) == 1:
+                        return [(group[0], e)]
+                    middle = len(group) // 2
+                    return await attempt(group[:middle]) + await attempt(group[middle:])
+                unwritten.difference_update(id(row) for _, row in group)
+                DB_ROWS_FLUSHED.labels("interactions").inc(len(group_interactions))
+                DB_ROWS_FLUSHED.labels("sessions").inc(len(group_sessions))
+                return []
+
+            try:
+                failed = await attempt(units)
+                if failed:
+                    await self.write(lambda conn: conn.executemany(INSERT_DEAD_LETTER_SQL, [
+                        (kind, _dead_letter_payload(kind, row), str(error), now_ms())
+                        for (kind, row), error in failed
+                    ]))
+                    for (kind, _), error in failed:
+                        DB_ROWS_DEAD_LETTERED.labels(kind).inc()
+                        logger.error("[Database] Moved a %s row that cannot be written to dead_letters: %s", kind, error)
+            except Exception:
+                # Not a row problem after all (or dead_letters is unwritable): keep what is left for later
+                on_commit()
+                self._requeue(
+                    [row for kind, row in units if kind == 'interaction' and id(row) in unwritten],
+                    [row for kind, row in units if kind == 'session' and id(row) in unwritten],
+                )
+                raise
+            on_commit()
+
+    def _requeue(self, interactions: List[Dict], sessions: List[tuple]):
+        """Put failed rows back ahead of anything buffered since, so the next flush retries them"""
+        self._pending_interactions[:0] = interactions
+        for session_id, turns in sessions:
+            self._pending_sessions[session_id] = turns + self._pending_sessions.get(session_id, [])
+
+    async def buffer_session_turn(self, session_id: str, turn: Dict):
+        """Queue one turn's session state change (utils.session_state.apply_turn) for the next flush"""
+        self._pending_sessions.setdefault(session_id, []).append(turn)
+        await self._buffered()
+
+    def pending_session_turns(self, session_id: str) -> List[Dict]:
+        """Buffered turns for a session that are not yet visible in the table, oldest first"""
+        return self._inflight_sessions.get(session_id, []) + self._pending_sessions.get(session_id, [])
+
+    def _pending_for(self, session_id: str) -> List[Dict]:
+        return [
+            i for i in self._inflight_interactions + self._pending_interactions
+            if i['session_id'] == session_id
+        ]
+
+    # ==================== INTERACTIONS ====================
+
+    async def save_interaction(self, interaction: Dict):
+        """Save a conversation interaction (buffered until the next flush)"""
+        self._pending_interactions.append(interaction)
+        await self._buffered()
+
+    async def save_batch(self, new_sessions: List[tuple], interactions: List[Dict],
+                         session_turns: Dict[str, List[Dict]]):
+        """Write a batch of new sessions, interactions and session turns in one transaction
         
-        self.conn.commit()
-        print("[Database] Initialized successfully")
-    
-    def save_interaction(self, interaction: Dict):
-        """Save a conversation interaction"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO interactions 
-            (session_id, user_message, krishna_response, topic, emotion, verse_reference, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            interaction['session_id'],
-            interaction['user_message'],
-            interaction['krishna_response'],
-            interaction['topic'],
-            interaction['emotion'],
-            interaction['verse_reference'],
-            interaction['timestamp']
-        ))
-        self.conn.commit()
-    
-    def get_session_history(self, session_id: str, limit: int = 10) -> List[Dict]:
+        Bypasses the write-behind buffer: the batch is durable when this returns.
+        """
+        async def operation(conn):
+            await conn.executemany(INSERT_SESSION_SQL, new_sessions)
+            await _write_rows(conn, interactions, session_turns)
+
+        with DB_LATENCY.labels("batch").time():
+            await self.write(operation)
+        DB_ROWS_FLUSHED.labels("interactions").inc(len(interactions))
+        DB_ROWS_FLUSHED.labels("sessions").inc(len(session_turns))
+
+    async def get_session_history(self, session_id: str, limit: int = 10) -> List[Dict]:
         """Get conversation history for a session"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        rows = await self.fetchall('''
             SELECT user_message, krishna_response, topic, emotion, timestamp
             FROM interactions
             WHERE session_id = ?
-            ORDER BY timestamp DESC
+            ORDER BY timestamp DESC, id DESC
             LIMIT ?
         ''', (session_id, limit))
-        
-        rows = cursor.fetchall()
-        return [
+
+        history = [
             {
                 'user_message': row[0],
                 'krishna_response': row[1],
                 'topic': row[2],
                 'emotion': row[3],
-                'timestamp': row[4]
+                'timestamp': ms_to_iso(row[4])
             }
             for row in rows
         ]
-    
-    def clear_session(self, session_id: str):
+
+        # Read-your-writes: buffered rows are newer than anything in the table
+        pending = [
+            {
+                'user_message': i['user_message'],
+                'krishna_response': i['krishna_response'],
+                'topic': i['topic'],
+                'emotion': i['emotion'],
+                'timestamp': ms_to_iso(i['timestamp'])
+            }
+            for i in reversed(self._pending_for(session_id))
+        ]
+        return (pending + history)[:limit]
+
+    async def clear_session(self, session_id: str):
         """Clear all data for a session"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM interactions WHERE session_id = ?', (session_id,))
-        cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
-        self.conn.commit()
-    
-    def count_total_messages(self) -> int:
+        self._pending_interactions = [i for i in self._pending_interactions if i['session_id'] != session_id]
+        self._pending_sessions.pop(session_id, None)
+
+        async def operation(conn):
+            await conn.execute('DELETE FROM interactions WHERE session_id = ?', (session_id,))
+            await conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+        await self.write(operation)
+
+    async def count_total_messages(self) -> int:
         """Count total messages across all sessions"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM interactions')
-        return cursor.fetchone()[0]
-    
-    def close(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
-            print("[Database] Connection closed")
+        row = await self.fetchone("SELECT value FROM counters WHERE name = 'interactions'")
+        return row[0] + len(self._pending_interactions) + len(self._inflight_interactions)
+
+    async def count_total_sessions(self) -> int:
+        """Count sessions from the trigger-maintained counter row"""
+        row = await self.fetchone("SELECT value FROM counters WHERE name = 'sessions'")
+        return row[0]
+
+    async def close(self):
+        """Flush buffered writes, drain the writer and close every connection"""
+        if self._flusher_task:
+            self._closing = True
+            self._flush_wakeup.set()
+            await self._flusher_task
+            self._flusher_task = None
+            # Durability flush: nothing buffered is lost on a clean shutdown
+            await self.flush()
+
+        if self._writer_task:
+            stop = asyncio.get_running_loop().create_future()
+            await self._write_queue.put((None, stop, None))
+            await self._writer_task
+            self._writer_task = None
+
+        if self._readers:
+            while not self._readers.empty():
+                await self._readers.get_nowait().close()
 
+        if self.writer:
+            await self.writer.close()
+            self.writer = None
+            logger.info("[Database] Connection closed")
@@ -3,27 +3,51 @@ Krishna AI Agent - Main FastAPI Server
 Multi-agent system with MCP tools, session management, and observability
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
-import uvicorn
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import asyncio
 import json
+import math
 
-# ----------------- Load Gita JSON -----------------
-with open("data/bhagvad_gita.json", "r") as f:
-    gita_data = json.load(f)
+from config import (
+    ADMISSION_MAX_WAIT_S, AGENT_THREAD_POOL_SIZE, BATCH_CHAT_CHUNK_SIZE, DATABASE_PATH, GITA_CORPUS_PATH, GITA_DATA_PATH,
+    LLM_BASE_URL, LLM_BATCH_SIZE, LLM_BATCH_WINDOW_MS, LLM_MAX_CONCURRENCY, LLM_MAX_TOKENS,
+    LLM_MODEL, LLM_RETRY_AFTER_S, LLM_TIMEOUT_S, MAX_ACTIVE_CHATS, MAX_BATCH_ITEMS, MAX_QUEUED_CHATS,
+    OPENAI_API_KEY,
+    RATE_LIMIT_BURST, RATE_LIMIT_PER_MINUTE, RESPONSE_CACHE_BYTES, RESPONSE_CACHE_MIN_SIMILARITY,
+    SEEN_VERSES_SESSIONS, SESSION_TIMEOUT_HOURS, VERSE_EMBEDDINGS_PATH, VERSE_EMBEDDING_DIM, WORKERS
+)
 
 # Import our agents
 from agents.analyzer import InputAnalyzer
 from agents.verse_finder import VerseFinder
 from agents.krishna_ai import KrishnaAI
 from agents.action_suggester import ActionSuggester
+from agents.orchestrator import AgentOrchestrator, Stage
+from agents.batch_chat import BatchChat
 
 # Import tools and utilities
+from tools.gita_mcp_tool import GitaMCPTool
+from tools.llm_backend import OpenAICompatibleBackend
 from tools.memory_tool import MemoryManager
-from utils.logger import setup_logger, log_agent_activity
+from tools.verse_corpus import VerseCorpus
+from tools.verse_embeddings import VerseEmbeddings
+from utils import analytics_export
+from utils.analytics_export import AnalyticsExporter
+from utils.logger import get_log_stats, log_agent_activity, setup_logger, shutdown_logger
+from utils.metrics import AGENT_LATENCY, REQUESTS, registry
+from utils.response_cache import ResponseCache
+from utils.rate_limiter import (
+    EXISTING_SESSION, NEW_SESSION, REJECTED, AdmissionQueue, Overloaded, Ticket, TokenBuckets,
+)
+from utils.session_archiver import SessionArchiver
+from utils.seen_verses import SeenVerses
 from utils.session_manager import SessionManager
 from database import Database
 
@@ -44,17 +68,96 @@ app.add_middleware(
 logger = setup_logger()
 
 # Initialize database
-db = Database()
+db = Database(DATABASE_PATH)
 
 # Initialize all agents
 analyzer = InputAnalyzer()
-verse_finder = VerseFinder(gita_data)
-krishna_ai = KrishnaAI()
+# Compiled, memory-mapped corpus; recompiled only when the JSON source changes
+gita_corpus = VerseCorpus.load_or_build(GITA_DATA_PATH, GITA_CORPUS_PATH)
+verse_embeddings = VerseEmbeddings.load_or_build(
+    gita_corpus.verses, VERSE_EMBEDDINGS_PATH, VERSE_EMBEDDING_DIM
+)
+# Per-session bitsets of verses already shown, so repeat questions get fresh verses
+seen_verses = SeenVerses(len(gita_corpus), SEEN_VERSES_SESSIONS, SESSION_TIMEOUT_HOURS * 3600)
+verse_finder = VerseFinder(gita_corpus, verse_embeddings, seen_verses)
+llm_backend = OpenAICompatibleBackend(
+    LLM_BASE_URL, LLM_MODEL, api_key=OPENAI_API_KEY, max_tokens=LLM_MAX_TOKENS,
+    timeout_s=LLM_TIMEOUT_S, max_concurrency=LLM_MAX_CONCURRENCY, batch_size=LLM_BATCH_SIZE,
+    batch_window_ms=LLM_BATCH_WINDOW_MS, retry_after_s=LLM_RETRY_AFTER_S
+) if LLM_BASE_URL else None
+krishna_ai = KrishnaAI(backend=llm_backend)
+# Near-identical messages with the same analysis and verse reuse one generated response
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES, RESPONSE_CACHE_MIN_SIMILARITY)
 action_suggester = ActionSuggester()
 
+# CPU-bound agent stages run here so they don't stall the event loop
+agent_executor = ThreadPoolExecutor(max_workers=AGENT_THREAD_POOL_SIZE, thread_name_prefix="agent")
+
 # Initialize tools
-memory_manager = MemoryManager(db)
+gita_tool = GitaMCPTool(verse_finder)
 session_manager = SessionManager(db)
+memory_manager = MemoryManager(db, session_manager)
+
+def forget_sessions(session_ids: List[str]):
+    """Drop in-process copies of sessions that were archived"""
+    for session_id in session_ids:
+        session_manager.cache.pop(session_id)
+        memory_manager.history_cache.pop(session_id)
+        verse_finder.forget(session_id)
+
+# Background expiry of idle sessions to compressed cold storage
+session_archiver = SessionArchiver(db, on_expired=forget_sessions)
+# Background copy of interactions to Parquet for /analytics
+analytics_exporter = AnalyticsExporter(db)
+
+# Admission control: per-user token buckets, then a bounded queue for pipeline slots
+rate_limiter = TokenBuckets(RATE_LIMIT_PER_MINUTE / 60 / WORKERS, RATE_LIMIT_BURST)
+admission = AdmissionQueue(MAX_ACTIVE_CHATS, MAX_QUEUED_CHATS, ADMISSION_MAX_WAIT_S)
+
+AGENTS = [analyzer, verse_finder, krishna_ai, action_suggester]
+MCP_TOOLS = [gita_tool, memory_manager]
+
+# ==================== METRICS ====================
+
+# Refreshed by each /metrics scrape, the only place row counts are read
+latest_totals = {"sessions": 0, "messages": 0}
+
+registry.gauge(
+    "krishna_cache_hit_rate", "Hit rate of in-process caches",
+    lambda: {
+        ("sessions",): session_manager.cache.stats()["hit_rate"],
+        ("history",): memory_manager.history_cache.stats()["hit_rate"],
+        ("rendered_responses",): krishna_ai.rendered.stats()["hit_rate"],
+        ("responses",): response_cache.stats()["hit_rate"]
+    },
+    ("cache",)
+)
+registry.gauge(
+    "krishna_cache_entries", "Entries held by in-process caches",
+    lambda: {
+        ("sessions",): len(session_manager.cache),
+        ("history",): len(memory_manager.history_cache),
+        ("rendered_responses",): len(krishna_ai.rendered),
+        ("responses",): len(response_cache),
+        ("seen_verses",): len(seen_verses)
+    },
+    ("cache",)
+)
+registry.gauge(
+    "krishna_log_records", "Structured log pipeline: queued, dropped, written records and batches",
+    lambda: {(state,): value for state, value in get_log_stats().items()},
+    ("state",)
+)
+registry.gauge(
+    "krishna_admission", "Chat pipelines running and requests waiting, by lane",
+    lambda: {(state,): value for state, value in admission.stats().items()},
+    ("state",)
+)
+registry.gauge(
+    "krishna_stored_total", "Rows stored in the database",
+    lambda: {(kind,): value for kind, value in latest_totals.items()},
+    ("kind",)
+)
 
 # ==================== REQUEST/RESPONSE MODELS ====================
 
@@ -64,6 +167,11 @@ class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
 
+class BatchChatRequest(BaseModel):
+    """Many chat messages processed together (evaluation and re-scoring jobs)"""
+    items: List[ChatRequest] = Field(max_length=MAX_BATCH_ITEMS)
+    semantic: bool = False
+
 class ChatResponse(BaseModel):
     """Krishna's response"""
     response: str
@@ -71,6 +179,7 @@ class ChatResponse(BaseModel):
     suggestions: List[str]
     session_id: str
     analysis: Dict
+    timings: Optional[Dict[str, float]] = None
 
 class SessionInfo(BaseModel):
     """Session information"""
@@ -81,6 +190,133 @@ class SessionInfo(BaseModel):
     message_count: int
     created_at: str
     last_activity: str
+    summary: Optional[Dict] = None
+    trends: Optional[Dict] = None
+
+# ==================== HELPERS ====================
+
+async def admit(request: ChatRequest, endpoint: str) -> Ticket:
+    """Charge the user's bucket, then wait for a pipeline slot; 429 if either refuses"""
+    return await admit_costs({request.user_id: 1}, EXISTING_SESSION if request.session_id else NEW_SESSION, endpoint)
+
+async def admit_batch(request: BatchChatRequest) -> Ticket:
+    """One token per chunk from every user with items in it; the batch waits in the low-priority lane"""
+    costs: Dict[str, int] = {}
+    for start in range(0, len(request.items), BATCH_CHAT_CHUNK_SIZE):
+        for user_id in {item.user_id for item in request.items[start:start + BATCH_CHAT_CHUNK_SIZE]}:
+            costs[user_id] = costs.get(user_id, 0) + 1
+    return await admit_costs(costs, NEW_SESSION, "chat_batch")
+
+async def admit_costs(costs: Dict[str, int], priority: int, endpoint: str) -> Ticket:
+    """Charge each user cost tokens, then wait for a slot in the priority lane"""
+    user_id = None
+    try:
+        for user_id, cost in costs.items():
+            retry_after = rate_limiter.acquire(user_id, cost)
+            if retry_after:
+                REJECTED.labels("rate_limited").inc()
+                raise Overloaded("rate_limited", retry_after)
+        return await admission.acquire(priority)
+    except Overloaded as e:
+        REQUESTS.labels(endpoint, "rejected").inc()
+        logger.warning("[ADMISSION] Refused %s for user %s: %s", endpoint, user_id, e.reason)
+        raise HTTPException(status_code=429, detail=f"Too many requests ({e.reason})",
+                            headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def persist_turn(session_id: str, message: str, response: str, analysis: Dict, verse: Dict):
+    """Save the interaction and update session state (both write-behind)"""
+    # Save to memory (Long-term storage)
+    await memory_manager.save_interaction(
+        session_id=session_id,
+        user_message=message,
+        krishna_response=response,
+        analysis=analysis,
+        verse=verse
+    )
+    
+    # Update session state
+    await session_manager.update_session(
+        session_id=session_id,
+        topic=analysis['topic'],
+        emotion=analysis['emotion'],
+        emotions=analysis['scores']['emotions']
+    )
+
+# ==================== AGENT GRAPH ====================
+
+async def resolve_session(ctx: Dict) -> str:
+    """Get or create session"""
+    return await session_manager.resolve(ctx["session_id"], ctx["user_id"])
+
+def run_analyzer(ctx: Dict) -> Dict:
+    log_agent_activity("Agent 1: Analyzer", "Starting analysis")
+    analysis = analyzer.analyze(ctx["message"])
+    log_agent_activity("Agent 1: Analyzer", "Detected: %s (%s)", analysis['topic'], analysis['emotion'])
+    return analysis
+
+def run_verse_finder(ctx: Dict) -> Dict:
+    log_agent_activity("Agent 2: VerseFinder", "Searching Gita database via MCP")
+    verse = verse_finder.find(ctx["analysis"], ctx["message"], session_id=ctx["session"])
+    log_agent_activity("Agent 2: VerseFinder", "Found BG %s.%s", verse['chapter'], verse['verse_num'])
+    return verse
+
+async def load_history(ctx: Dict) -> Dict:
+    """Get the rolling session summary and the last few turns from memory"""
+    return await memory_manager.get_context(ctx["session"])
+
+async def generate_cached(message: str, verse: Dict, analysis: Dict, history: List[Dict],
+                          summary: Optional[Dict] = None) -> str:
+    """Serve from the response cache, generating (and caching) only on a miss
+
+    LLM prompts include the session's own history and summary, so those replies
+    are never shared through the cache; template replies don't depend on them.
+    """
+    shareable = krishna_ai.backend is None or not (history or (summary or {}).get("turns"))
+    if shareable:
+        cached = response_cache.get(message, analysis, verse)
+        if cached is not None:
+            log_agent_activity("Agent 3: KrishnaAI", "Served from response cache")
+            return cached
+    
+    response, source = await krishna_ai.generate_with_source(message, verse, analysis, history, summary)
+    # A template fallback would keep being served after the backend recovers
+    if shareable and source != "fallback":
+        response_cache.set(message, analysis, verse, response)
+    return response
+
+async def run_krishna_ai(ctx: Dict) -> str:
+    log_agent_activity("Agent 3: KrishnaAI", "Generating divine guidance")
+    response = await generate_cached(
+        message=ctx["message"],
+        verse=ctx["verse"],
+        analysis=ctx["analysis"],
+        history=ctx["history"]["recent"],
+        summary=ctx["history"]["summary"]
+    )
+    log_agent_activity("Agent 3: KrishnaAI", "Response generated successfully")
+    return response
+
+def run_action_suggester(ctx: Dict) -> List[str]:
+    log_agent_activity("Agent 4: ActionSuggester", "Creating follow-up suggestions")
+    return action_suggester.suggest(ctx["analysis"])
+
+batch_chat = BatchChat(
+    analyzer, verse_finder, action_suggester, generate_cached,
+    session_manager, memory_manager, executor=agent_executor
+)
+
+chat_pipeline = AgentOrchestrator([
+    Stage("session", resolve_session),
+    Stage("analysis", run_analyzer),
+    Stage("verse", run_verse_finder, deps=["analysis", "session"]),
+    Stage("history", load_history, deps=["session"]),
+    Stage("suggestions", run_action_suggester, deps=["analysis"]),
+    Stage("response", run_krishna_ai, deps=["analysis", "verse", "history"]),
+], executor=agent_executor)
 
 # ==================== API ENDPOINTS ====================
 
@@ -97,131 +333,243 @@ async def root():
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
-    Main chat endpoint - Sequential agent flow
+    Main chat endpoint - Concurrent agent graph
     
-    Flow:
-    1. Agent 1: Analyze input
-    2. Agent 2: Find relevant Gita verse (MCP Tool)
-    3. Agent 3: Generate Krishna's response (LLM)
-    4. Agent 4: Suggest follow-up actions
+    Flow (stages start as soon as their inputs are ready):
+    1. Session lookup/creation       | Agent 1: Analyze input
+    2. Memory: load history (session) | Agent 2: Find verse (analysis, MCP Tool)
+                                      | Agent 4: Suggest actions (analysis)
+    3. Agent 3: Generate Krishna's response (analysis, verse, history)
     """
+    ticket = await admit(request, "chat")
     try:
-        # Get or create session
-        session_id = request.session_id or session_manager.create_session(request.user_id)
-        session = session_manager.get_session(session_id)
+        logger.info("[SESSION %s] New message from user %s", request.session_id or 'new', request.user_id)
         
-        logger.info(f"[SESSION {session_id}] New message from user {request.user_id}")
-        
-        # ===== AGENT 1: ANALYZE INPUT =====
-        log_agent_activity("Agent 1: Analyzer", "Starting analysis")
-        analysis = analyzer.analyze(request.message)
-        log_agent_activity("Agent 1: Analyzer", f"Detected: {analysis['topic']} ({analysis['emotion']})")
-        
-        # ===== AGENT 2: FIND VERSE (MCP TOOL) =====
-        log_agent_activity("Agent 2: VerseFinder", "Searching Gita database via MCP")
-        verse = verse_finder.find_relevant_verse(analysis)
-        log_agent_activity("Agent 2: VerseFinder", f"Found BG {verse['chapter']}.{verse['verse_num']}")
-        
-        # ===== AGENT 3: GENERATE RESPONSE (LLM) =====
-        log_agent_activity("Agent 3: KrishnaAI", "Generating divine guidance")
-        
-        # Get conversation history from memory
-        history = memory_manager.get_conversation_history(session_id)
-        
-        # Generate Krishna's response
-        response = await krishna_ai.generate_response(
+        results, timings = await chat_pipeline.run(
+            user_id=request.user_id,
             message=request.message,
-            verse=verse,
-            analysis=analysis,
-            history=history
+            session_id=request.session_id
         )
-        log_agent_activity("Agent 3: KrishnaAI", "Response generated successfully")
+        session_id = results["session"]
         
-        # ===== AGENT 4: SUGGEST ACTIONS =====
-        log_agent_activity("Agent 4: ActionSuggester", "Creating follow-up suggestions")
-        suggestions = action_suggester.suggest_actions(analysis)
+        log_agent_activity("Orchestrator", "Stage timings (ms): %s", timings)
+        for stage, ms in timings.items():
+            AGENT_LATENCY.labels(stage).observe(ms)
         
-        # Save to memory (Long-term storage)
-        memory_manager.save_interaction(
-            session_id=session_id,
-            user_message=request.message,
-            krishna_response=response,
-            analysis=analysis,
-            verse=verse
-        )
-        
-        # Update session state
-        session_manager.update_session(
-            session_id=session_id,
-            topic=analysis['topic'],
-            emotion=analysis['emotion']
-        )
+        await persist_turn(session_id, request.message, results["response"], results["analysis"], results["verse"])
         
-        logger.info(f"[SESSION {session_id}] Response delivered successfully")
+        logger.info("[SESSION %s] Response delivered successfully", session_id)
+        REQUESTS.labels("chat", "ok").inc()
         
         return ChatResponse(
-            response=response,
-            verse=verse,
-            suggestions=suggestions,
+            response=results["response"],
+            verse=results["verse"],
+            suggestions=results["suggestions"],
             session_id=session_id,
-            analysis=analysis
+            analysis=results["analysis"],
+            timings=timings
         )
         
     except Exception as e:
-        logger.error(f"[ERROR] Chat endpoint failed: {str(e)}")
+        REQUESTS.labels("chat", "error").inc()
+        logger.error("[ERROR] Chat endpoint failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        ticket.release()
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint - Server-Sent Events
+    
+    Emits each agent's output as soon as it is ready:
+    session -> analysis -> verse -> response (chunked) -> suggestions -> done.
+    The turn is persisted after the stream has been fully delivered.
+    """
+    # Held until the stream ends (or the response is torn down without running it)
+    ticket = await admit(request, "chat_stream")
+    try:
+        session_id = await session_manager.resolve(request.session_id, request.user_id)
+    except Exception as e:
+        ticket.release()
+        logger.error("[ERROR] Chat stream failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    logger.info("[SESSION %s] New streamed message from user %s", session_id, request.user_id)
+    
+    async def events():
+        try:
+            async for event in stream_turn():
+                yield event
+        finally:
+            ticket.release()
+    
+    async def stream_turn():
+        try:
+            yield sse_event("session", {"session_id": session_id})
+            
+            log_agent_activity("Agent 1: Analyzer", "Starting analysis")
+            analysis = analyzer.analyze(request.message)
+            yield sse_event("analysis", analysis)
+            
+            log_agent_activity("Agent 2: VerseFinder", "Searching Gita database via MCP")
+            verse = verse_finder.find(analysis, request.message, session_id=session_id)
+            yield sse_event("verse", verse)
+            
+            log_agent_activity("Agent 3: KrishnaAI", "Streaming divine guidance")
+            context = await memory_manager.get_context(session_id)
+            response = await generate_cached(request.message, verse, analysis, context["recent"], context["summary"])
+            for chunk in KrishnaAI.paragraphs(response):
+                yield sse_event("response", {"text": chunk})
+            
+            log_agent_activity("Agent 4: ActionSuggester", "Creating follow-up suggestions")
+            yield sse_event("suggestions", action_suggester.suggest(analysis))
+            yield sse_event("done", {"session_id": session_id})
+        except Exception as e:
+            REQUESTS.labels("chat_stream", "error").inc()
+            logger.error("[ERROR] Chat stream failed: %s", e)
+            yield sse_event("error", {"detail": str(e)})
+            return
+        
+        # Only reached once the client has received every event
+        await persist_turn(session_id, request.message, response, analysis, verse)
+        logger.info("[SESSION %s] Streamed response delivered successfully", session_id)
+        REQUESTS.labels("chat_stream", "ok").inc()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release)
+    )
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    Batch chat endpoint - NDJSON stream, one result line per item in input order
+    
+    Items are analyzed, matched and persisted in chunks, each chunk in a single
+    transaction. Items without a session_id share one new session per user_id.
+    At most MAX_BATCH_ITEMS items; the whole batch holds one pipeline slot.
+    """
+    # Held until the last line is sent (or the response is torn down without running it)
+    ticket = await admit_batch(request)
+    items = [item.model_dump() for item in request.items]
+    logger.info("[BATCH] %d messages", len(items))
+    
+    async def lines():
+        try:
+            async for result in batch_chat.run(items, semantic=request.semantic):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            REQUESTS.labels("chat_batch", "error").inc()
+            logger.error("[ERROR] Chat batch failed: %s", e)
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        finally:
+            ticket.release()
+        REQUESTS.labels("chat_batch", "ok").inc()
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(ticket.release))
 
 @app.get("/session/{session_id}", response_model=SessionInfo)
 async def get_session(session_id: str):
     """Get session information"""
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
         return SessionInfo(**session)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"[ERROR] Get session failed: {str(e)}")
+        logger.error("[ERROR] Get session failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/history/{session_id}")
 async def get_history(session_id: str):
     """Get conversation history for a session"""
     try:
-        history = memory_manager.get_conversation_history(session_id)
+        history = await memory_manager.get_conversation_history(session_id)
         return {"session_id": session_id, "history": history}
     except Exception as e:
-        logger.error(f"[ERROR] Get history failed: {str(e)}")
+        logger.error("[ERROR] Get history failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/session/{session_id}")
 async def clear_session(session_id: str):
     """Clear a session (for testing or user reset)"""
     try:
-        session_manager.delete_session(session_id)
-        memory_manager.clear_session_memory(session_id)
-        logger.info(f"[SESSION {session_id}] Cleared successfully")
+        await session_manager.delete_session(session_id)
+        await memory_manager.clear_session_memory(session_id)
+        verse_finder.forget(session_id)
+        logger.info("[SESSION %s] Cleared successfully", session_id)
         return {"status": "success", "message": "Session cleared"}
     except Exception as e:
-        logger.error(f"[ERROR] Clear session failed: {str(e)}")
+        logger.error("[ERROR] Clear session failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/metrics")
+@app.get("/analytics")
+async def get_analytics(group_by: List[str] = Query(["topic"]), since: Optional[datetime] = None,
+                        until: Optional[datetime] = None, refresh: bool = False):
+    """Message and session counts per group, computed over the Parquet export"""
+    if not analytics_export.available():
+        raise HTTPException(status_code=503, detail="Analytics requires pyarrow")
+    if refresh and not analytics_exporter.exporting:
+        # Another worker holds the export lock; exporting here would race it over the same id range
+        raise HTTPException(status_code=409, detail="Refresh is only available on the exporting worker; "
+                                                    "retry, or query without refresh")
+    try:
+        if refresh:
+            await analytics_exporter.export_new()
+        return await asyncio.to_thread(
+            analytics_export.aggregate, analytics_exporter.directory, group_by, since, until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("[ERROR] Analytics query failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def refresh_totals():
+    latest_totals["sessions"] = await session_manager.get_total_sessions()
+    latest_totals["messages"] = await memory_manager.get_total_messages()
+
+@app.get("/metrics", response_class=PlainTextResponse)
 async def get_metrics():
-    """Observability: Get system metrics"""
+    """Observability: Prometheus text exposition of latency histograms, counters and cache stats"""
+    try:
+        await refresh_totals()
+        return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        logger.error("[ERROR] Get metrics failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics/summary")
+async def get_metrics_summary():
+    """Observability: JSON summary with p50/p95/p99 per stage"""
     try:
-        total_sessions = session_manager.get_total_sessions()
-        total_messages = memory_manager.get_total_messages()
+        await refresh_totals()
         
         return {
-            "total_sessions": total_sessions,
-            "total_messages": total_messages,
-            "active_agents": 4,
-            "mcp_tools": 2,
+            "total_sessions": latest_totals["sessions"],
+            "total_messages": latest_totals["messages"],
+            "active_agents": len(AGENTS),
+            "mcp_tools": len(MCP_TOOLS),
+            "cache": {
+                "sessions": session_manager.cache.stats(),
+                "history": memory_manager.history_cache.stats(),
+                "responses": response_cache.stats(),
+                "seen_verses": seen_verses.stats()
+            },
+            "llm": llm_backend.stats() if llm_backend else None,
+            "admission": {**admission.stats(), "users": rate_limiter.stats()},
+            "metrics": registry.summary(),
             "status": "operational"
         }
     except Exception as e:
-        logger.error(f"[ERROR] Get metrics failed: {str(e)}")
+        logger.error("[ERROR] Get metrics summary failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # ==================== STARTUP/SHUTDOWN ====================
@@ -230,8 +578,12 @@ async def get_metrics():
 async def startup_event():
     """Initialize database and agents on startup"""
     logger.info("🕉️  Krishna AI Agent starting up...")
-    db.initialize()
+    await db.initialize()
     logger.info("✅ Database initialized")
+    if session_archiver.start():
+        logger.info("✅ Session expiry scheduled")
+    if analytics_exporter.start():
+        logger.info("✅ Analytics export scheduled")
     logger.info("✅ All agents ready")
     logger.info("✅ MCP tools loaded")
     logger.info("🙏 Krishna AI Agent is now active")
@@ -240,16 +592,20 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Krishna AI Agent shutting down...")
-    db.close()
+    await session_archiver.stop()
+    await analytics_exporter.stop()
+    await db.flush()
+    logger.info("✅ Buffered writes flushed")
+    await db.close()
+    if llm_backend:
+        await llm_backend.close()
+    agent_executor.shutdown(wait=False)
     logger.info("Namaste 🙏")
+    shutdown_logger()
 
 # ==================== RUN SERVER ====================
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,  # Auto-reload on code changes
-        log_level="info"
-    )
\ No newline at end of file
+    # Development server with auto-reload; production runs `python serve.py`
+    from serve import main as serve
+    serve(["--reload"])
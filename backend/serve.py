@@ -0,0 +1,50 @@
+"""
+Production launcher: one uvicorn worker process per CPU core
+
+Each worker imports main.py on its own and opens its own SQLite connections
+in the startup hook; WAL mode and IMMEDIATE write transactions let the
+workers share one database file.
+
+Run from backend/:  python serve.py [--workers N] [--port 8000]
+Development (single process, auto-reload):  python serve.py --reload
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+from config import HOST, PORT
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the Krishna AI API")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--reload", action="store_true",
+                        help="single process that restarts on code changes")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers = 1 if args.reload else max(1, args.workers)
+
+    # Workers are fresh interpreters that read config from the environment
+    os.environ["WORKERS"] = str(workers)
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=None if args.reload else workers,
+        reload=args.reload,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
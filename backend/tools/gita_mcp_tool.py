@@ -5,8 +5,15 @@ MCP Tool for accessing Bhagavad Gita verses
 Follows Model Context Protocol specification
 """
 
+from typing import Dict
+
+from utils.logger import get_logger
+
+logger = get_logger("gita_mcp_tool")
+
 class GitaMCPTool: 
-    def __init__(self):
+    def __init__(self, verse_finder):
+        self.verse_finder = verse_finder
         self.tool_name = "gita_verse_finder"
         self.tool_description = "Search and retrieve relevant Bhagavad Gita verses"
         self.version = "1.0.0"
@@ -38,16 +45,19 @@ class GitaMCPTool:
         
         This follows MCP protocol for tool execution
         """
-        print(f"[MCP Tool] Executing: {self.tool_name} with topic='{topic}'")
+        logger.info("[MCP Tool] Executing: %s with topic='%s'", self.tool_name, topic)
         
-        # In production, this would query vector database
-        # For now, simple lookup
-        verse_finder = VerseFinder()
+        # Cosine search over the precomputed verse embedding matrix
         analysis = {'topic': topic}
-        result = verse_finder.find_relevant_verse(analysis)
+        matches = self.verse_finder.top_k(context, analysis, k=3, semantic=True)
+        result = matches[0][0] if matches else self.verse_finder.find(analysis, context)
         
         return {
             "status": "success",
             "tool": self.tool_name,
-            "result": result
+            "result": result,
+            "matches": [
+                {"verse": verse, "score": round(score, 4)}
+                for verse, score in matches
+            ]
         }
\ No newline at end of file
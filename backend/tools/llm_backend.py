@@ -0,0 +1,165 @@
+"""
+LLM Backend: Pluggable text generation for KrishnaAI
+OpenAI-compatible /v1/completions client with a pooled keep-alive session
+
+Concurrent prompts are micro-batched: generate() calls arriving within a short
+window are sent together as one completions request with a list of prompts.
+In-flight HTTP requests are capped by a semaphore and every call is bounded
+by a timeout, so callers can fall back to templates when the backend is slow.
+"""
+
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from utils.logger import get_logger
+
+logger = get_logger("llm_backend")
+
+
+class GenerationBackend(ABC):
+    """Interface: turn a prompt into generated text"""
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        """Generated text for the prompt"""
+
+    async def close(self):
+        pass
+
+
+class BackendUnavailable(Exception):
+    """The backend failed recently and is being skipped until it may have recovered"""
+
+
+class OpenAICompatibleBackend(GenerationBackend):
+    """Micro-batching client for any server speaking the OpenAI completions API"""
+
+    name = "openai_compatible"
+
+    def __init__(self, base_url: str, model: str, api_key: str = "", max_tokens: int = 400,
+                 temperature: float = 0.7, timeout_s: float = 8.0, max_concurrency: int = 8,
+                 batch_size: int = 16, batch_window_ms: float = 10, retry_after_s: float = 30,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout_s = timeout_s
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.retry_after_s = retry_after_s
+
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        # One pooled client for the process: connections are kept alive between batches
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers=headers,
+            timeout=httpx.Timeout(timeout_s, connect=min(timeout_s, 2.0)),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._batch_task: Optional[asyncio.Task] = None
+        self._batch_tasks: set = set()
+        self._down_until = 0.0
+        self.batches = 0
+        self.prompts = 0
+
+    async def generate(self, prompt: str) -> str:
+        """Queue the prompt for the next batch and wait for its completion"""
+        if time.monotonic() < self._down_until:
+            raise BackendUnavailable("LLM backend is marked down")
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark failures as retrieved even if the caller already gave up waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending.append((prompt, future))
+        if len(self._pending) >= self.batch_size:
+            self._dispatch()
+        elif self._batch_task is None:
+            self._batch_task = asyncio.create_task(self._dispatch_after_window())
+
+        # shield: a caller timing out must not cancel the batch other callers share
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout_s)
+
+    async def _dispatch_after_window(self):
+        await asyncio.sleep(self.batch_window)
+        self._batch_task = None
+        self._dispatch()
+
+    def _dispatch(self):
+        """Send everything queued so far as one request"""
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            self._batch_task = None
+        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        if self._pending:
+            self._batch_task = asyncio.create_task(self._dispatch_after_window())
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            # Keep a reference so the task isn't collected mid-flight
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        prompts = [prompt for prompt, _ in batch]
+        try:
+            async with self._semaphore:
+                response = await self.client.post("/v1/completions", json={
+                    "model": self.model,
+                    "prompt": prompts,
+                    "max_tokens": self.max_tokens,
+                    "temperature": self.temperature,
+                })
+            response.raise_for_status()
+            texts = self._parse(response.json(), len(prompts))
+        except Exception as e:
+            self._down_until = time.monotonic() + self.retry_after_s
+            logger.warning("[LLM] Batch of %d failed, backend marked down for %ss: %s",
+                           len(batch), self.retry_after_s, e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.prompts += len(batch)
+        for (_, future), text in zip(batch, texts):
+            if not future.done():
+                future.set_result(text)
+
+    @staticmethod
+    def _parse(body: Dict, expected: int) -> List[str]:
+        """Map choices back to prompt order by their index"""
+        texts: List[Optional[str]] = [None] * expected
+        for position, choice in enumerate(body.get("choices", [])):
+            index = choice.get("index", position)
+            if 0 <= index < expected:
+                texts[index] = choice.get("text", "").strip()
+        if any(text is None for text in texts):
+            raise ValueError(f"Completions response had {len(body.get('choices', []))} choices for {expected} prompts")
+        return texts
+
+    async def close(self):
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            self._batch_task = None
+        for _, future in self._pending:
+            if not future.done():
+                future.set_exception(BackendUnavailable("LLM backend closed"))
+        self._pending = []
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "prompts": self.prompts,
+            "avg_batch_size": round(self.prompts / self.batches, 2) if self.batches else 0.0,
+            "down": time.monotonic() < self._down_until,
+        }
@@ -0,0 +1,77 @@
+"""
+LLM Stub: Local OpenAI-compatible completions server for tests and load runs
+Deterministic replies, optional artificial latency and failure rate
+
+Run from backend/:  python -m tools.llm_stub [--port 8001] [--delay-ms 200]
+In-process:  OpenAICompatibleBackend(..., transport=httpx.ASGITransport(app=create_app()))
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from typing import Dict, List, Union
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+
+class CompletionRequest(BaseModel):
+    model: str = "stub"
+    prompt: Union[str, List[str]]
+    max_tokens: int = 400
+    temperature: float = 0.7
+
+
+def stub_completion(prompt: str) -> str:
+    """Same prompt, same reply: quotes the last content line of the prompt back"""
+    lines = [line for line in prompt.splitlines() if line.strip() and not line.rstrip().endswith(":")]
+    quoted = lines[-1] if lines else ""
+    return f"Dear friend, reflect on this: {quoted} [stub:{zlib.crc32(prompt.encode('utf-8')):08x}]"
+
+
+def create_app(delay_ms: float = 0.0, failure_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI(title="LLM Stub")
+    rng = random.Random(seed)
+    app.state.requests = 0
+    app.state.prompts = 0
+
+    @app.post("/v1/completions")
+    async def completions(request: CompletionRequest) -> Dict:
+        prompts = [request.prompt] if isinstance(request.prompt, str) else request.prompt
+        app.state.requests += 1
+        app.state.prompts += len(prompts)
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        if failure_rate and rng.random() < failure_rate:
+            raise HTTPException(status_code=503, detail="stub failure")
+
+        return {
+            "id": f"cmpl-stub-{app.state.requests}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": request.model,
+            "choices": [
+                {"index": i, "text": stub_completion(prompt), "logprobs": None, "finish_reason": "stop"}
+                for i, prompt in enumerate(prompts)
+            ],
+        }
+
+    @app.get("/stats")
+    async def stats() -> Dict:
+        return {"requests": app.state.requests, "prompts": app.state.prompts}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible completions stub")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.delay_ms, args.failure_rate), host="127.0.0.1", port=args.port)
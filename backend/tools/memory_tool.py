@@ -2,41 +2,89 @@
 Memory Tool: Manages conversation history and long-term memory
 """
 
-from typing import List, Dict, Optional
-from datetime import datetime
-import json
+from collections import deque
+from typing import List, Dict
+
+from config import HISTORY_CACHE_SIZE, MAX_CONVERSATION_HISTORY, RECENT_TURNS_IN_CONTEXT, SESSION_TIMEOUT_HOURS
+from database import ms_to_iso, now_ms
+from utils.cache import LRUCache
+from utils.logger import get_logger
+
+logger = get_logger("memory")
 
 class MemoryManager:
     """Manages session memory and conversation history"""
     
-    def __init__(self, database):
+    def __init__(self, database, session_manager=None):
         self.db = database
+        # Owner of the per-session rolling summary stored alongside each session
+        self.session_manager = session_manager
+        # Per-session ring buffer of the most recent turns, oldest first
+        self.history_cache = LRUCache(HISTORY_CACHE_SIZE, SESSION_TIMEOUT_HOURS * 3600)
     
-    def save_interaction(self, session_id: str, user_message: str,
-                        krishna_response: str, analysis: Dict, verse: Dict):
-        """Save a conversation interaction to memory"""
-        interaction = {
+    @staticmethod
+    def build_interaction(session_id: str, user_message: str, krishna_response: str,
+                          analysis: Dict, verse: Dict) -> Dict:
+        """The stored row for one turn"""
+        return {
             'session_id': session_id,
             'user_message': user_message,
             'krishna_response': krishna_response,
             'topic': analysis['topic'],
             'emotion': analysis['emotion'],
             'verse_reference': f"BG {verse['chapter']}.{verse['verse_num']}",
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_ms()
         }
+    
+    async def save_interaction(self, session_id: str, user_message: str,
+                        krishna_response: str, analysis: Dict, verse: Dict):
+        """Save a conversation interaction to memory"""
+        interaction = self.build_interaction(session_id, user_message, krishna_response, analysis, verse)
         
-        self.db.save_interaction(interaction)
-        print(f"[Memory] Saved interaction for session {session_id}")
+        await self.db.save_interaction(interaction)
+        
+        # Write through; sessions not yet cached load complete history on first read
+        turns = self.history_cache.peek(session_id)
+        if turns is not None:
+            turns.append({
+                'user_message': user_message,
+                'krishna_response': krishna_response,
+                'topic': interaction['topic'],
+                'emotion': interaction['emotion'],
+                'timestamp': ms_to_iso(interaction['timestamp'])
+            })
+        logger.info("[Memory] Saved interaction for session %s", session_id, extra={"session_id": session_id})
+    
+    async def get_conversation_history(self, session_id: str, limit: int = 10) -> List[Dict]:
+        """Retrieve conversation history for context, newest first"""
+        if limit > MAX_CONVERSATION_HISTORY or not self.history_cache.max_entries:
+            return await self.db.get_session_history(session_id, limit)
+        
+        turns = self.history_cache.get(session_id)
+        if turns is None:
+            rows = await self.db.get_session_history(session_id, MAX_CONVERSATION_HISTORY)
+            turns = deque(reversed(rows), maxlen=MAX_CONVERSATION_HISTORY)
+            self.history_cache.set(session_id, turns)
+        
+        return list(reversed(turns))[:limit]
     
-    def get_conversation_history(self, session_id: str, limit: int = 10) -> List[Dict]:
-        """Retrieve conversation history for context"""
-        return self.db.get_session_history(session_id, limit)
+    async def get_context(self, session_id: str, recent: int = RECENT_TURNS_IN_CONTEXT) -> Dict:
+        """Generation context: the session's rolling summary plus only the last few turns
+        
+        Cost stays flat however long the session grows.
+        """
+        summary = await self.session_manager.get_summary(session_id) if self.session_manager else None
+        return {
+            'summary': summary,
+            'recent': await self.get_conversation_history(session_id, limit=recent)
+        }
     
-    def clear_session_memory(self, session_id: str):
+    async def clear_session_memory(self, session_id: str):
         """Clear all memory for a session"""
-        self.db.clear_session(session_id)
-        print(f"[Memory] Cleared session {session_id}")
+        self.history_cache.pop(session_id)
+        await self.db.clear_session(session_id)
+        logger.info("[Memory] Cleared session %s", session_id, extra={"session_id": session_id})
     
-    def get_total_messages(self) -> int:
+    async def get_total_messages(self) -> int:
         """Get total message count across all sessions"""
-        return self.db.count_total_messages()
+        return await self.db.count_total_messages()
@@ -0,0 +1,230 @@
+"""
+Verse Corpus: Compact, memory-mapped Gita corpus
+The JSON corpus is compiled once into a single binary file:
+
+    header | verse records | string table | refs | curated topics | text blob | metadata JSON
+
+Verse records are fixed-size; long text fields are (offset, length) pairs into
+the shared UTF-8 blob and list fields point at interned strings. Workers map
+the file read-only, so pages are shared and text is only decoded when a verse
+is actually returned.
+
+Build ahead of time (run from backend/):  python -m tools.verse_corpus
+"""
+
+import json
+import os
+import struct
+import sys
+from collections.abc import Sequence
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger("verse_corpus")
+
+MAGIC = b"GITA"
+FORMAT_VERSION = 1
+
+# magic, version, verses, strings, refs, curated topics, blob bytes, metadata bytes
+HEADER = struct.Struct("<4sIIIIIII")
+HEADER_SIZE = 32
+
+TEXT_FIELDS = ("sanskrit", "transliteration", "translation", "context")
+LIST_FIELDS = ("topic", "keywords")
+# Key order of the verse dicts handed to the API, same as the JSON source
+VERSE_FIELDS = ("id", "chapter", "verse_num", "sanskrit", "transliteration", "translation",
+                "topic", "context", "keywords")
+
+# Text fields are (blob offset, byte length); list fields are (refs start, count)
+RECORD_DTYPE = np.dtype(
+    [("id", "<u4"), ("chapter", "<u2"), ("verse_num", "<u2")]
+    + [(field, "<u4", (2,)) for field in TEXT_FIELDS + LIST_FIELDS]
+)
+STRING_DTYPE = np.dtype([("offset", "<u4"), ("length", "<u4")])
+# Curated topic -> verse ids; `name` is a string table id, ids live in refs
+TOPIC_DTYPE = np.dtype([("name", "<u4"), ("start", "<u4"), ("count", "<u4")])
+
+
+def encode_corpus(gita_data: Dict) -> bytes:
+    """Compile the JSON corpus into the binary layout"""
+    verses = gita_data.get("verses", [])
+    blob = bytearray()
+    strings: List[int] = []  # flattened (offset, length)
+    string_ids: Dict[str, int] = {}
+    refs: List[int] = []
+
+    def put_text(text: str):
+        data = (text or "").encode("utf-8")
+        offset = len(blob)
+        blob.extend(data)
+        return offset, len(data)
+
+    def intern(text: str) -> int:
+        if text not in string_ids:
+            string_ids[text] = len(string_ids)
+            strings.extend(put_text(text))
+        return string_ids[text]
+
+    def put_refs(values: Iterable[int]):
+        start = len(refs)
+        refs.extend(values)
+        return start, len(refs) - start
+
+    records = np.zeros(len(verses), dtype=RECORD_DTYPE)
+    for record, verse in zip(records, verses):
+        record["id"] = verse["id"]
+        record["chapter"] = verse.get("chapter", 0)
+        record["verse_num"] = verse.get("verse_num", 0)
+        for field in TEXT_FIELDS:
+            record[field] = put_text(verse.get(field, ""))
+        for field in LIST_FIELDS:
+            record[field] = put_refs(intern(value) for value in verse.get(field, []))
+
+    curated = gita_data.get("topics", {})
+    topics = np.zeros(len(curated), dtype=TOPIC_DTYPE)
+    for row, (name, verse_ids) in zip(topics, curated.items()):
+        row["name"] = intern(name)
+        row["start"], row["count"] = put_refs(verse_ids)
+
+    metadata = json.dumps(gita_data.get("metadata", {}), ensure_ascii=False).encode("utf-8")
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(records), len(string_ids), len(refs),
+                         len(topics), len(blob), len(metadata))
+    return b"".join([
+        header.ljust(HEADER_SIZE, b"\0"),
+        records.tobytes(),
+        np.asarray(strings, dtype="<u4").tobytes(),
+        np.asarray(refs, dtype="<u4").tobytes(),
+        topics.tobytes(),
+        bytes(blob),
+        metadata,
+    ])
+
+
+def build_corpus(json_path: str, path: str):
+    """Compile the JSON corpus at json_path into the binary file at path"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = encode_corpus(json.load(f))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    # Atomic swap: workers starting concurrently never map a half-written file
+    os.replace(tmp_path, path)
+    logger.info("[Corpus] Compiled %s into %s (%d bytes)", json_path, path, len(data))
+
+
+class VerseView(Sequence):
+    """Read-only list of verse dicts, decoded from the corpus on access"""
+
+    def __init__(self, corpus: "VerseCorpus"):
+        self._corpus = corpus
+
+    def __len__(self) -> int:
+        return len(self._corpus)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._corpus.verse(i) for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("verse position out of range")
+        return self._corpus.verse(position)
+
+
+class VerseCorpus:
+    """Fixed-size verse records over a read-only buffer (mmap'd file or bytes)"""
+
+    def __init__(self, buffer: np.ndarray):
+        magic, version, n_verses, n_strings, n_refs, n_topics, blob_size, meta_size = \
+            HEADER.unpack_from(bytes(buffer[:HEADER.size]))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a v{FORMAT_VERSION} verse corpus")
+
+        offset = HEADER_SIZE
+
+        def section(dtype, count):
+            nonlocal offset
+            size = np.dtype(dtype).itemsize * count
+            view = buffer[offset:offset + size].view(dtype)
+            offset += size
+            return view
+
+        self.records = section(RECORD_DTYPE, n_verses)
+        string_table = section(STRING_DTYPE, n_strings)
+        self.refs = section("<u4", n_refs)
+        topic_rows = section(TOPIC_DTYPE, n_topics)
+        self.blob = buffer[offset:offset + blob_size]
+        self._metadata = buffer[offset + blob_size:offset + blob_size + meta_size]
+
+        # Tags and topic names repeat across verses: decode each exactly once
+        self.strings = [
+            sys.intern(self._text(int(start), int(length))) for start, length in string_table.tolist()
+        ]
+        self.ids = self.records["id"]
+        self.positions_by_id = {verse_id: position for position, verse_id in enumerate(self.ids.tolist())}
+        self.topics: Dict[str, List[int]] = {
+            self.strings[name]: self.refs[start:start + count].tolist()
+            for name, start, count in topic_rows.tolist()
+        }
+        self.verses = VerseView(self)
+
+    @classmethod
+    def from_data(cls, gita_data: Dict) -> "VerseCorpus":
+        """In-memory corpus straight from parsed JSON (tests, benchmarks)"""
+        return cls(np.frombuffer(encode_corpus(gita_data), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path: str) -> "VerseCorpus":
+        """Map the compiled corpus read-only"""
+        return cls(np.memmap(path, dtype=np.uint8, mode="r"))
+
+    @classmethod
+    def load_or_build(cls, json_path: str, path: str) -> "VerseCorpus":
+        """Load the compiled corpus, recompiling it first if missing or older than the JSON"""
+        stale = not os.path.exists(path) or (
+            os.path.exists(json_path) and os.path.getmtime(json_path) > os.path.getmtime(path)
+        )
+        if stale:
+            build_corpus(json_path, path)
+        return cls.load(path)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def metadata(self) -> Dict:
+        return json.loads(bytes(self._metadata).decode("utf-8")) if len(self._metadata) else {}
+
+    def _text(self, start: int, length: int) -> str:
+        return bytes(self.blob[start:start + length]).decode("utf-8")
+
+    def field(self, position: int, name: str):
+        """Decode a single field of one verse"""
+        record = self.records[position]
+        if name in TEXT_FIELDS:
+            start, length = record[name].tolist()
+            return self._text(start, length)
+        if name in LIST_FIELDS:
+            start, count = record[name].tolist()
+            return [self.strings[i] for i in self.refs[start:start + count].tolist()]
+        return int(record[name])
+
+    def verse(self, position: int) -> Dict:
+        """Materialize the full verse dict"""
+        return {name: self.field(position, name) for name in VERSE_FIELDS}
+
+    def project(self, fields: Iterable[str]) -> List[Dict]:
+        """Verse dicts holding only the given fields, e.g. what an index build reads"""
+        fields = tuple(fields)
+        return [{name: self.field(position, name) for name in fields} for position in range(len(self))]
+
+
+if __name__ == "__main__":
+    from config import GITA_CORPUS_PATH, GITA_DATA_PATH
+
+    build_corpus(GITA_DATA_PATH, GITA_CORPUS_PATH)
@@ -0,0 +1,184 @@
+"""
+Verse Embeddings: Offline, CPU-only semantic retrieval
+Hashed TF-IDF vectors precomputed into a float32 matrix and memory-mapped from .npy
+
+Files are content-addressed: both names carry a hash of the indexed verse text
+and the dimension, so an edited corpus never reuses stale vectors. Each file is
+written to a temp name and renamed into place, IDF first and matrix last, so
+a matrix on disk always has its IDF. A rebuild creates new files instead of
+truncating ones other workers may have mapped.
+
+Build ahead of time (run from backend/):  python -m tools.verse_embeddings
+"""
+
+import glob
+import hashlib
+import json
+import math
+import os
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from tools.verse_index import FIELD_WEIGHTS, tokenize
+from utils.logger import get_logger
+
+logger = get_logger("verse_embeddings")
+
+DEFAULT_DIM = 1024
+
+
+def _bucket(token: str, dim: int) -> Tuple[int, float]:
+    """Stable hash of a token to (column, sign); crc32 so builds match across processes"""
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+def _hashed_counts(text_weights: List[Tuple[str, float]], dim: int) -> Dict[int, float]:
+    """Accumulate weighted token counts into hashed columns"""
+    counts: Dict[int, float] = defaultdict(float)
+    for text, weight in text_weights:
+        for token in tokenize(text):
+            column, sign = _bucket(token, dim)
+            counts[column] += sign * weight
+    return counts
+
+
+def _verse_fields(verse: Dict) -> List[Tuple[str, float]]:
+    fields = []
+    for field, weight in FIELD_WEIGHTS.items():
+        value = verse.get(field) or ""
+        if isinstance(value, list):
+            value = " ".join(value)
+        fields.append((value, weight))
+    return fields
+
+
+def fingerprint(fields: Sequence[List[Tuple[str, float]]], dim: int) -> str:
+    """Hash of everything the matrix is built from"""
+    digest = hashlib.sha1(f"{dim}".encode("utf-8"))
+    for verse_fields in fields:
+        for text, weight in verse_fields:
+            digest.update(f"\x1e{weight}\x1f{text}".encode("utf-8"))
+        digest.update(b"\x1d")
+    return digest.hexdigest()[:16]
+
+
+def _versioned_path(path: str, version: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{version}{ext}"
+
+
+def _idf_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".idf.npy"
+
+
+def _save(path: str, array: np.ndarray):
+    """np.save to a temp name, then rename: readers see the old file or the whole new one"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _remove_stale(path: str, keep: str):
+    """Delete other versions; workers that still map one keep their pages until they exit"""
+    stem, ext = os.path.splitext(path)
+    # Includes the unversioned files earlier builds wrote at `path` itself
+    for stale in glob.glob(f"{glob.escape(stem)}.*{ext}") + [path]:
+        if stale not in (keep, _idf_path(keep)) and ".tmp." not in stale:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+
+def _build(fields: Sequence[List[Tuple[str, float]]], path: str, dim: int):
+    rows = [_hashed_counts(verse_fields, dim) for verse_fields in fields]
+
+    doc_freq = np.zeros(dim, dtype=np.float32)
+    for counts in rows:
+        for column in counts:
+            doc_freq[column] += 1
+    idf = np.log((1 + len(rows)) / (1 + doc_freq)).astype(np.float32) + 1.0
+
+    matrix = np.zeros((len(rows), dim), dtype=np.float32)
+    for i, counts in enumerate(rows):
+        for column, value in counts.items():
+            matrix[i, column] = math.copysign(1 + math.log(abs(value)), value) if value else 0.0
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # The matrix marks a complete build, so it goes last
+    _save(_idf_path(path), idf)
+    _save(path, matrix)
+    logger.info("[Embeddings] Built %dx%d verse matrix at %s", matrix.shape[0], dim, path)
+
+
+def build_embeddings(verses: Sequence[Dict], path: str, dim: int = DEFAULT_DIM) -> str:
+    """Encode all verses into the matrix and IDF files for this corpus version; returns the matrix path"""
+    fields = [_verse_fields(verse) for verse in verses]
+    versioned = _versioned_path(path, fingerprint(fields, dim))
+    _build(fields, versioned, dim)
+    _remove_stale(path, versioned)
+    return versioned
+
+
+class VerseEmbeddings:
+    """Memory-mapped verse matrix scored with one matrix multiply per batch"""
+
+    def __init__(self, matrix: np.ndarray, idf: np.ndarray):
+        self.matrix = matrix
+        self.idf = idf
+        self.dim = matrix.shape[1]
+
+    @classmethod
+    def load(cls, path: str) -> "VerseEmbeddings":
+        """Map the prebuilt matrix read-only; pages are shared between workers"""
+        return cls(np.load(path, mmap_mode="r"), np.load(_idf_path(path)))
+
+    @classmethod
+    def load_or_build(cls, verses: Sequence[Dict], path: str, dim: int = DEFAULT_DIM) -> "VerseEmbeddings":
+        """Load the matrix built from exactly these verses, building it first if there is none"""
+        fields = [_verse_fields(verse) for verse in verses]
+        versioned = _versioned_path(path, fingerprint(fields, dim))
+        if not os.path.exists(versioned):
+            _build(fields, versioned, dim)
+            _remove_stale(path, versioned)
+        return cls.load(versioned)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode queries into L2-normalized rows with the corpus IDF"""
+        queries = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for column, value in _hashed_counts([(text, 1.0)], self.dim).items():
+                queries[i, column] = value
+        queries *= self.idf
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        return queries / np.where(norms == 0, 1, norms)
+
+    def search(self, texts: List[str], k: int = 5) -> List[List[Tuple[int, float]]]:
+        """Cosine top-k verse positions for a batch of queries"""
+        if not texts or not len(self.matrix):
+            return [[] for _ in texts]
+
+        scores = self.encode(texts) @ self.matrix.T
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append([(int(position), float(row[position])) for position in ordered if row[position] > 0])
+        return results
+
+
+if __name__ == "__main__":
+    from config import GITA_DATA_PATH, VERSE_EMBEDDINGS_PATH, VERSE_EMBEDDING_DIM
+
+    with open(GITA_DATA_PATH, "r") as f:
+        build_embeddings(json.load(f)["verses"], VERSE_EMBEDDINGS_PATH, VERSE_EMBEDDING_DIM)
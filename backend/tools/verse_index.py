@@ -0,0 +1,100 @@
+"""
+Verse Index: Precomputed inverted index over the Gita corpus
+Ranks every verse against a message with BM25 weights
+"""
+
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+STOPWORDS = frozenset({
+    "a", "about", "all", "am", "an", "and", "are", "as", "at", "be", "but", "by",
+    "do", "for", "from", "has", "have", "i", "im", "in", "is", "it", "its", "me",
+    "my", "not", "o", "of", "on", "or", "so", "such", "that", "the", "this", "to",
+    "was", "what", "who", "will", "with", "you", "your",
+})
+
+# Field weights: curated topic/keyword tags count more than free text
+FIELD_WEIGHTS = {
+    "topic": 3.0,
+    "keywords": 2.0,
+    "translation": 1.0,
+    "context": 0.5,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-letters, drop stopwords and plural 's'"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class VerseIndex:
+    """Inverted index: token -> posting list of (verse position, BM25 weight)"""
+
+    def __init__(self, verses: List[Dict], k1: float = 1.2, b: float = 0.75):
+        self.size = len(verses)
+        self.postings: Dict[str, Tuple[Tuple[int, float], ...]] = {}
+        self._build(verses, k1, b)
+
+    def _build(self, verses: List[Dict], k1: float, b: float):
+        """Compute field-weighted term frequencies and bake BM25 weights into postings"""
+        term_freqs = []
+        doc_lengths = []
+        for verse in verses:
+            tf: Dict[str, float] = defaultdict(float)
+            for field, weight in FIELD_WEIGHTS.items():
+                value = verse.get(field) or ""
+                if isinstance(value, list):
+                    value = " ".join(value)
+                for token in tokenize(value):
+                    tf[token] += weight
+            term_freqs.append(tf)
+            doc_lengths.append(sum(tf.values()))
+
+        avg_length = (sum(doc_lengths) / self.size) if self.size else 0.0
+        doc_freq: Dict[str, int] = defaultdict(int)
+        for tf in term_freqs:
+            for token in tf:
+                doc_freq[token] += 1
+
+        postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for position, tf in enumerate(term_freqs):
+            norm = k1 * (1 - b + b * doc_lengths[position] / avg_length) if avg_length else k1
+            for token, freq in tf.items():
+                df = doc_freq[token]
+                idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+                postings[token].append((position, idf * freq * (k1 + 1) / (freq + norm)))
+
+        self.postings = {token: tuple(plist) for token, plist in postings.items()}
+
+    def search(self, query: Dict[str, float], k: int = 5) -> List[Tuple[int, float]]:
+        """Return the top-k (verse position, score) pairs for weighted query terms"""
+        scores: Dict[int, float] = defaultdict(float)
+        for token, query_weight in query.items():
+            for position, weight in self.postings.get(token, ()):
+                scores[position] += query_weight * weight
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    @staticmethod
+    def build_query(texts: Iterable[str], boosts: Dict[str, float] = None) -> Dict[str, float]:
+        """Turn free text plus boosted terms (e.g. detected topic) into query weights"""
+        query: Dict[str, float] = defaultdict(float)
+        for text in texts:
+            for token in tokenize(text):
+                query[token] += 1.0
+        for term, boost in (boosts or {}).items():
+            for token in tokenize(term):
+                query[token] += boost
+        return dict(query)
@@ -0,0 +1,303 @@
+"""
+Analytics export: interactions to columnar Parquet files, aggregated with Arrow
+
+A background task copies new interaction rows out of SQLite every
+ANALYTICS_EXPORT_INTERVAL_S. Reads go through the reader pool in id order, so
+they never hold the write lock:
+  - only rows past the watermark (highest exported id) are read; the watermark
+    is the largest id range in the file names, so there is no separate state
+    to fall out of step with the files
+  - topic, emotion and verse_reference are dictionary-encoded; message bodies
+    are not exported, only their lengths
+  - each file is written to a temp name and renamed, so readers see whole files
+  - runs of small files are merged into one; a file whose id range lies inside
+    another file's range is superseded and skipped, so a crash mid-merge cannot
+    double-count
+  - in one process, merging and scanning share a lock; a scan that still finds
+    a file gone (merged by another worker) lists the files again and rescans
+With several workers, one process at a time exports (advisory file lock).
+
+/analytics scans the files with pyarrow.dataset (column projection, timestamp
+predicates pushed into the Parquet reader) and groups with Arrow compute.
+Requires the optional `pyarrow` package; without it the exporter stays off.
+"""
+
+import asyncio
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import (
+    ANALYTICS_COMPACT_TARGET_ROWS, ANALYTICS_DIR, ANALYTICS_EXPORT_BATCH_ROWS,
+    ANALYTICS_EXPORT_INTERVAL_S,
+)
+from utils.logger import get_logger
+from utils.metrics import registry
+from utils.process_lock import try_lock
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: analytics export is disabled without pyarrow
+    pa = pc = ds = pq = None
+
+logger = get_logger("analytics_export")
+
+ROWS_EXPORTED = registry.counter(
+    "krishna_analytics_rows_exported_total", "Interactions copied to Parquet"
+)
+
+EXPORT_SQL = '''
+    SELECT id, session_id, topic, emotion, verse_reference, timestamp,
+           length(user_message), length(krishna_response)
+    FROM interactions
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+'''
+
+COLUMNS = ("id", "session_id", "topic", "emotion", "verse_reference", "timestamp",
+           "message_chars", "response_chars")
+GROUP_KEYS = ("topic", "emotion", "verse_reference", "day")
+
+FILE_PATTERN = re.compile(r"^interactions-(\d+)-(\d+)\.parquet$")
+
+# Rescans allowed when a compaction in another process removes files mid-scan
+SCAN_ATTEMPTS = 3
+
+# Held while compaction swaps files and while aggregate scans them
+_files_lock = threading.Lock()
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def schema():
+    label = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.int64()),
+        ("session_id", pa.string()),
+        ("topic", label),
+        ("emotion", label),
+        ("verse_reference", label),
+        ("timestamp", pa.timestamp("ms", tz="UTC")),
+        ("message_chars", pa.int32()),
+        ("response_chars", pa.int32()),
+    ])
+
+
+def list_files(directory: str) -> List[Tuple[int, int, str]]:
+    """(first id, last id, path) of live export files in id order, superseded ones dropped"""
+    if not os.path.isdir(directory):
+        return []
+    ranges = []
+    for name in os.listdir(directory):
+        match = FILE_PATTERN.match(name)
+        if match:
+            ranges.append((int(match.group(1)), int(match.group(2)), os.path.join(directory, name)))
+    # Widest range first at each start, so a merged file hides the parts it replaced
+    ranges.sort(key=lambda r: (r[0], -r[1]))
+    live = []
+    for first, last, path in ranges:
+        if live and last <= live[-1][1]:
+            continue
+        live.append((first, last, path))
+    return live
+
+
+def write_file(directory: str, rows: Sequence[tuple]) -> str:
+    """Write rows (EXPORT_SQL order) as one Parquet file named by their id range"""
+    columns = list(zip(*rows))
+    table = pa.Table.from_arrays(
+        [pa.array(values) for values in columns], names=list(COLUMNS)
+    ).cast(schema())
+    return _write_table(directory, table, rows[0][0], rows[-1][0])
+
+
+def _write_table(directory: str, table, first_id: int, last_id: int) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"interactions-{first_id:012d}-{last_id:012d}.parquet")
+    # Unique per process, so a writer that lost the export lock can never clobber the exporter's file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd", use_dictionary=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def compact(directory: str, target_rows: int = ANALYTICS_COMPACT_TARGET_ROWS) -> int:
+    """Merge adjacent small files into files of up to target_rows; returns files removed"""
+    removed = 0
+    run: List[Tuple[int, int, str]] = []
+    run_rows = 0
+
+    def merge():
+        nonlocal removed
+        if len(run) < 2:
+            return
+        table = pa.concat_tables([pq.read_table(path, schema=schema()) for _, _, path in run])
+        with _files_lock:
+            _write_table(directory, table.unify_dictionaries(), run[0][0], run[-1][1])
+            for _, _, path in run:
+                os.remove(path)
+        removed += len(run)
+
+    for first, last, path in list_files(directory):
+        rows = pq.ParquetFile(path).metadata.num_rows
+        if run_rows + rows > target_rows:
+            merge()
+            run, run_rows = [], 0
+        if rows < target_rows:
+            run.append((first, last, path))
+            run_rows += rows
+    merge()
+    return removed
+
+
+def _to_ms(value: Optional[datetime]):
+    if value is None:
+        return None
+    # Naive values are local time, like the ISO timestamps the API returns (ms_to_iso)
+    value = value.astimezone(timezone.utc)
+    return pa.scalar(value, pa.timestamp("ms", tz="UTC"))
+
+
+def _scan(directory: str, columns: List[str], condition):
+    """(table, files scanned) over the live files, rescanning if a merge removes one underneath"""
+    for attempt in range(SCAN_ATTEMPTS):
+        with _files_lock:
+            files = [path for _, _, path in list_files(directory)]
+            if not files:
+                return None, 0
+            try:
+                dataset = ds.dataset(files, schema=schema(), format="parquet")
+                return dataset.to_table(columns=columns, filter=condition), len(files)
+            except FileNotFoundError:
+                # The merged file was written before its parts were removed, so a fresh listing is whole
+                if attempt == SCAN_ATTEMPTS - 1:
+                    raise
+                logger.info("[Analytics] Export files changed during scan, rescanning")
+
+
+def aggregate(directory: str, group_by: Sequence[str] = ("topic",),
+              since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict:
+    """Messages, distinct sessions and average message length per group, over all exported files"""
+    group_by = list(dict.fromkeys(group_by))
+    unknown = [key for key in group_by if key not in GROUP_KEYS]
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(unknown)}; choose from {', '.join(GROUP_KEYS)}")
+
+    condition = None
+    for op, bound in ((pc.greater_equal, _to_ms(since)), (pc.less, _to_ms(until))):
+        if bound is not None:
+            clause = op(ds.field("timestamp"), bound)
+            condition = clause if condition is None else condition & clause
+
+    columns = ["id", "session_id", "timestamp", "message_chars"]
+    columns += [key for key in group_by if key != "day"]
+    table, files = _scan(directory, columns, condition)
+    if table is None:
+        return {"rows_scanned": 0, "files": 0, "groups": []}
+    # Each file carries its own dictionaries; grouping needs one per column
+    table = table.unify_dictionaries()
+    if "day" in group_by:
+        table = table.append_column("day", pc.floor_temporal(table["timestamp"], unit="day"))
+
+    result = table.group_by(group_by).aggregate([
+        ("id", "count"), ("session_id", "count_distinct"), ("message_chars", "mean"),
+    ])
+    result = result.sort_by([("id_count", "descending")])
+
+    groups = []
+    for row in result.to_pylist():
+        group = {key: row[key] for key in group_by}
+        if "day" in group and group["day"] is not None:
+            group["day"] = group["day"].date().isoformat()
+        group["messages"] = row["id_count"]
+        group["sessions"] = row["session_id_count_distinct"]
+        group["avg_message_chars"] = round(row["message_chars_mean"] or 0.0, 1)
+        groups.append(group)
+    return {"rows_scanned": table.num_rows, "files": files, "groups": groups}
+
+
+class AnalyticsExporter:
+    """Background, watermark-driven copy of interactions into Parquet"""
+
+    def __init__(self, database, directory: str = ANALYTICS_DIR,
+                 batch_rows: int = ANALYTICS_EXPORT_BATCH_ROWS,
+                 interval_s: float = ANALYTICS_EXPORT_INTERVAL_S):
+        self.db = database
+        self.directory = directory
+        self.batch_rows = batch_rows
+        self.interval_s = interval_s
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+        self._export_lock = asyncio.Lock()
+
+    def watermark(self) -> int:
+        """Highest interaction id already exported"""
+        files = list_files(self.directory)
+        return files[-1][1] if files else 0
+
+    @property
+    def exporting(self) -> bool:
+        """Whether this process holds the export lock (only it may write files)"""
+        return self._lock_file is not None
+
+    def start(self) -> bool:
+        """Start the background loop if pyarrow is present and this process wins the export lock"""
+        if not available():
+            logger.info("[Analytics] pyarrow not installed; export disabled")
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = try_lock(os.path.join(self.directory, ".export.lock"))
+        if self._lock_file is None:
+            logger.info("[Analytics] Another worker runs the export")
+            return False
+        self._task = asyncio.create_task(self._loop())
+        return True
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                if await self.export_new():
+                    await asyncio.to_thread(compact, self.directory)
+            except Exception as e:
+                logger.error("[Analytics] Export pass failed, will retry: %s", e)
+
+    async def export_new(self) -> int:
+        """Copy interactions past the watermark, batch_rows per file; returns rows exported
+
+        Only call this in the process holding the export lock (see exporting).
+        """
+        async with self._export_lock:
+            # Rows still in the write-behind buffer have no id yet
+            await self.db.flush()
+            watermark = self.watermark()
+            exported = 0
+            while True:
+                rows = await self.db.fetchall(EXPORT_SQL, (watermark, self.batch_rows))
+                if not rows:
+                    break
+                path = await asyncio.to_thread(write_file, self.directory, rows)
+                watermark = rows[-1][0]
+                exported += len(rows)
+                ROWS_EXPORTED.labels().inc(len(rows))
+                logger.info("[Analytics] Exported %d interactions to %s", len(rows), path)
+                if len(rows) < self.batch_rows:
+                    break
+            return exported
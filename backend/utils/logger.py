@@ -1,19 +1,163 @@
+"""
+Structured logging off the request path
+
+Log calls only enqueue the record. A background thread drains the queue in
+batches, renders each record as one JSON line and writes the batch to the
+log file and stderr with a single write per sink. The queue is bounded:
+when it is full, records are dropped and counted instead of blocking.
+"""
+
+import atexit
+import json
 import logging
-from datetime import datetime
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from config import LOG_BATCH_SIZE, LOG_FILE, LOG_LEVEL, LOG_QUEUE_SIZE
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.Handler):
+    """Enqueue records without blocking; count what doesn't fit"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__()
+        self.queue = log_queue
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord):
+        # %-style args are merged on the writer thread; callers pass immutable values
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingLogWriter(threading.Thread):
+    """Background thread: drain up to batch_size records, format, write once per sink"""
+
+    def __init__(self, log_queue: queue.Queue, sinks: List, batch_size: int):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = log_queue
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.formatter = JsonFormatter()
+        self.written = 0
+        self.batches = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=0.25)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: List[logging.LogRecord]):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception as e:
+                lines.append(json.dumps({"level": "ERROR", "message": f"Unformattable log record: {e}"}))
+        payload = "\n".join(lines) + "\n"
+        for sink in self.sinks:
+            try:
+                sink.write(payload)
+                sink.flush()
+            except Exception:
+                pass
+        self.written += len(batch)
+        self.batches += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=5)
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_writer: Optional[BatchingLogWriter] = None
+_log_file = None
+
 
 def setup_logger():
-    """Configure logging for observability"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('krishna_ai.log'),
-            logging.StreamHandler()
-        ]
-    )
+    """Configure logging for observability (idempotent)"""
+    global _handler, _writer, _log_file
+    if _writer is None:
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _log_file = open(LOG_FILE, "a", encoding="utf-8")
+        _writer = BatchingLogWriter(log_queue, [_log_file, sys.stderr], LOG_BATCH_SIZE)
+        _writer.start()
+        _handler = DroppingQueueHandler(log_queue)
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_handler)
+        atexit.register(shutdown_logger)
     return logging.getLogger('KrishnaAI')
 
-def log_agent_activity(agent_name: str, activity: str):
-    """Log agent activity for observability"""
+
+def get_logger(component: str) -> logging.Logger:
+    """Logger for one component, e.g. get_logger('verse_finder') -> KrishnaAI.verse_finder"""
+    return logging.getLogger(f'KrishnaAI.{component}')
+
+
+def shutdown_logger():
+    """Write out everything still queued and close the log file"""
+    global _handler, _writer, _log_file
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+    if _log_file is not None:
+        _log_file.close()
+        _log_file = None
+    _handler = None
+
+
+def get_log_stats() -> Dict[str, int]:
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "written": _writer.written if _writer else 0,
+        "batches": _writer.batches if _writer else 0,
+    }
+
+
+def log_agent_activity(agent_name: str, activity: str, *args):
+    """Log agent activity for observability; `activity` takes %-style args, merged on the writer thread"""
     logger = logging.getLogger('KrishnaAI')
-    logger.info(f"[{agent_name}] {activity}")
+    if args:
+        logger.info("[%s] " + activity, agent_name, *args, extra={"agent": agent_name})
+    else:
+        logger.info("[%s] %s", agent_name, activity, extra={"agent": agent_name})
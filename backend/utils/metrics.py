@@ -0,0 +1,242 @@
+"""
+Hot-path metrics: counters and latency histograms exported in Prometheus text format
+
+Recording never takes a lock: every thread writes to its own shard of
+counts, and shards are only summed when metrics are scraped.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Milliseconds; spans in-memory agents (~0.1ms) to slow generations (seconds)
+DEFAULT_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _ShardedCounts:
+    """Per-thread arrays of numbers; a thread only ever mutates its own shard"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._register_lock = threading.Lock()  # Only taken the first time a thread records
+
+    def mine(self) -> List[float]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = [0] * self.size
+            with self._register_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def totals(self) -> List[float]:
+        totals = [0] * self.size
+        for shard in list(self._shards):
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self):
+        self._counts = _ShardedCounts(1)
+
+    def inc(self, amount: float = 1):
+        self._counts.mine()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._counts.totals()[0]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with bucket-interpolated quantiles"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        # One slot per bucket, one for +Inf, then the running sum
+        self._counts = _ShardedCounts(len(self.buckets) + 2)
+
+    def observe(self, value: float):
+        shard = self._counts.mine()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    @contextmanager
+    def time(self):
+        """Observe the elapsed milliseconds of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe((time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """(per-bucket counts incl. +Inf, count, sum)"""
+        totals = self._counts.totals()
+        counts = totals[:-1]
+        return counts, sum(counts), totals[-1]
+
+    def quantile(self, q: float, counts: List[float] = None) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if counts is None:
+            counts = self.snapshot()[0]
+        total = sum(counts)
+        if not total:
+            return 0.0
+
+        rank = q * total
+        seen = 0.0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class _Family:
+    """A metric name with labelled children created on first use"""
+
+    def __init__(self, kind: str, name: str, help_text: str, labelnames: Tuple[str, ...], factory: Callable):
+        self.kind = kind
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._factory = factory
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, self._factory())
+        return child
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(round(value, 6))
+
+
+class MetricsRegistry:
+    """Holds every metric family and renders them for scraping"""
+
+    def __init__(self):
+        self.families: Dict[str, _Family] = {}
+        self.gauges: Dict[str, Tuple[str, Callable[[], Dict[Tuple[str, ...], float]], Tuple[str, ...]]] = {}
+        self.started_at = time.time()
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> _Family:
+        return self.families.setdefault(name, _Family("counter", name, help_text, labelnames, Counter))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS_MS) -> _Family:
+        return self.families.setdefault(
+            name, _Family("histogram", name, help_text, labelnames, lambda: Histogram(buckets))
+        )
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], Dict[Tuple[str, ...], float]],
+              labelnames: Tuple[str, ...] = ()):
+        """Gauges are computed at scrape time (e.g. cache hit rates)"""
+        self.gauges[name] = (help_text, collect, labelnames)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP krishna_uptime_seconds Seconds since the process started",
+            "# TYPE krishna_uptime_seconds gauge",
+            f"krishna_uptime_seconds {_format_value(time.time() - self.started_at)}",
+        ]
+
+        for family in self.families.values():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in sorted(family.children.items()):
+                if family.kind == "counter":
+                    lines.append(f"{family.name}{_format_labels(family.labelnames, values)} {_format_value(child.value)}")
+                    continue
+
+                counts, count, total = child.snapshot()
+                cumulative = 0
+                for bound, bucket_count in zip(child.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    le = f'le="{bound}"'
+                    lines.append(f"{family.name}_bucket{_format_labels(family.labelnames, values, le)} {_format_value(cumulative)}")
+                lines.append(f"{family.name}_sum{_format_labels(family.labelnames, values)} {_format_value(total)}")
+                lines.append(f"{family.name}_count{_format_labels(family.labelnames, values)} {_format_value(count)}")
+
+            if family.kind == "histogram" and family.children:
+                lines.append(f"# HELP {family.name}_quantile Bucket-interpolated latency quantiles")
+                lines.append(f"# TYPE {family.name}_quantile gauge")
+                for values, child in sorted(family.children.items()):
+                    counts = child.snapshot()[0]
+                    for q in QUANTILES:
+                        label = _format_labels(family.labelnames, values, f'quantile="{q}"')
+                        lines.append(f"{family.name}_quantile{label} {_format_value(child.quantile(q, counts))}")
+
+        for name, (help_text, collect, labelnames) in self.gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for values, value in sorted(collect().items()):
+                lines.append(f"{name}{_format_labels(labelnames, values)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        """JSON-friendly view: counts, throughput and p50/p95/p99 per histogram child"""
+        uptime = max(time.time() - self.started_at, 1e-9)
+        result: Dict[str, Dict] = {}
+        for family in self.families.values():
+            entries = {}
+            for values, child in sorted(family.children.items()):
+                key = ",".join(values) or "all"
+                if family.kind == "counter":
+                    entries[key] = {"total": child.value, "per_second": round(child.value / uptime, 3)}
+                    continue
+                counts, count, total = child.snapshot()
+                entries[key] = {
+                    "count": count,
+                    "mean_ms": round(total / count, 3) if count else 0.0,
+                    **{f"p{int(q * 100)}_ms": round(child.quantile(q, counts), 3) for q in QUANTILES},
+                }
+            result[family.name] = entries
+        for name, (_, collect, _) in self.gauges.items():
+            result[name] = {",".join(values) or "all": value for values, value in collect().items()}
+        return result
+
+
+# Process-wide registry and the metrics recorded on the hot path
+registry = MetricsRegistry()
+
+AGENT_LATENCY = registry.histogram(
+    "krishna_agent_latency_ms", "Latency of each agent stage in milliseconds", ("stage",)
+)
+DB_LATENCY = registry.histogram(
+    "krishna_db_latency_ms", "Latency of database calls in milliseconds", ("op",)
+)
+REQUESTS = registry.counter(
+    "krishna_requests_total", "API requests handled", ("endpoint", "status")
+)
+DB_ROWS_FLUSHED = registry.counter(
+    "krishna_db_rows_flushed_total", "Rows written by write-behind flushes", ("table",)
+)
+DB_ROWS_DEAD_LETTERED = registry.counter(
+    "krishna_db_rows_dead_lettered_total", "Buffered rows that could not be written, moved to dead_letters", ("kind",)
+)
+GENERATIONS = registry.counter(
+    "krishna_generations_total", "Responses generated, by source (template, LLM backend, fallback)", ("source",)
+)
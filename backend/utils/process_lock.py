@@ -0,0 +1,23 @@
+"""
+Advisory cross-process lock: elects one worker for background jobs
+"""
+
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows: every process acts as the leader
+    fcntl = None
+
+
+def try_lock(path: str) -> Optional[IO]:
+    """Take an exclusive lock on path without waiting; returns the open file (keep it) or None"""
+    lock_file = open(path, "a")
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except OSError:
+        lock_file.close()
+        return None
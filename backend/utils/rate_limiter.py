@@ -0,0 +1,210 @@
+"""
+Admission control for /chat: per-user token buckets and a bounded priority queue
+
+TokenBuckets keeps one bucket per user_id in flat numpy arrays (token count
+and last refill time, indexed by a slot number), so each user costs 12 bytes
+of array state plus a dict entry and an owner pointer. Buckets are refilled
+lazily on access. When the arrays run out of free slots, every bucket that
+would be full again is reclaimed in one vectorized pass before the arrays
+grow. A full bucket behaves the same as a new user's bucket, so this loses
+nothing.
+
+AdmissionQueue bounds how many chat pipelines run at once. Excess requests
+wait in two FIFO lanes: turns in existing sessions ahead of requests that
+create a session. When the queue is full, a new-session waiter is shed to
+make room for an existing-session turn. Otherwise the arriving request is
+rejected. Waiters also give up after max_wait_s. Every rejection raises
+Overloaded, which the API turns into 429 with Retry-After.
+
+State is per process. With several workers, the per-user rate is split
+between them (config), which approximates one shared limit when the kernel
+spreads connections evenly.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import registry
+
+EXISTING_SESSION = 0
+NEW_SESSION = 1
+
+REJECTED = registry.counter(
+    "krishna_requests_rejected_total", "Chat requests refused by admission control", ("reason",)
+)
+
+
+class Overloaded(Exception):
+    """Request refused; retry_after is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """Per-key token buckets in compact arrays"""
+
+    def __init__(self, rate_per_s: float, burst: float, initial_slots: int = 1024):
+        self.rate = rate_per_s
+        self.burst = float(burst)
+        self._slots: Dict[str, int] = {}
+        self._tokens = np.zeros(initial_slots, dtype=np.float32)
+        self._updated = np.zeros(initial_slots, dtype=np.float64)
+        self._owners: List[Optional[str]] = [None] * initial_slots
+        self._free: List[int] = list(range(initial_slots - 1, -1, -1))
+        self.reclaimed = 0
+
+    def acquire(self, key: str, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """Take cost tokens from key's bucket; returns 0 if allowed, else seconds until it would be"""
+        now = time.monotonic() if now is None else now
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._allocate(key, now)
+        tokens = min(self.burst, float(self._tokens[slot]) + (now - self._updated[slot]) * self.rate)
+        self._updated[slot] = now
+        if tokens >= cost:
+            self._tokens[slot] = tokens - cost
+            return 0.0
+        self._tokens[slot] = tokens
+        return (cost - tokens) / self.rate
+
+    def _allocate(self, key: str, now: float) -> int:
+        if not self._free:
+            self._reclaim(now)
+            # Grow unless the sweep freed plenty, so sweeps stay amortized O(1) per allocation
+            if len(self._free) < len(self._owners) // 4:
+                self._grow()
+        slot = self._free.pop()
+        self._slots[key] = slot
+        self._owners[slot] = key
+        self._tokens[slot] = self.burst
+        self._updated[slot] = now
+        return slot
+
+    def _reclaim(self, now: float):
+        """Free every slot whose bucket has refilled to the brim"""
+        refilled = self._tokens + (now - self._updated) * self.rate
+        for slot in np.flatnonzero(refilled >= self.burst).tolist():
+            owner = self._owners[slot]
+            if owner is not None:
+                del self._slots[owner]
+                self._owners[slot] = None
+                self._free.append(slot)
+                self.reclaimed += 1
+
+    def _grow(self):
+        size = len(self._owners)
+        self._tokens = np.concatenate([self._tokens, np.zeros(size, dtype=np.float32)])
+        self._updated = np.concatenate([self._updated, np.zeros(size, dtype=np.float64)])
+        self._owners.extend([None] * size)
+        self._free.extend(range(2 * size - 1, size - 1, -1))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "tracked": len(self._slots),
+            "slots": len(self._owners),
+            "reclaimed": self.reclaimed,
+            "array_bytes": self._tokens.nbytes + self._updated.nbytes,
+        }
+
+
+class Ticket:
+    """An admitted request's slot; release() is idempotent"""
+
+    def __init__(self, queue: "AdmissionQueue"):
+        self._queue = queue
+
+    def release(self):
+        if self._queue is not None:
+            queue, self._queue = self._queue, None
+            queue._release()
+
+
+class AdmissionQueue:
+    """Bounded concurrency with a bounded two-lane wait queue"""
+
+    def __init__(self, max_active: int, max_waiting: int, max_wait_s: float):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.max_wait_s = max_wait_s
+        self.active = 0
+        self._lanes: Tuple[Deque[asyncio.Future], Deque[asyncio.Future]] = (deque(), deque())
+
+    @property
+    def waiting(self) -> int:
+        return len(self._lanes[EXISTING_SESSION]) + len(self._lanes[NEW_SESSION])
+
+    async def acquire(self, priority: int) -> Ticket:
+        """Wait for a slot; raises Overloaded if the queue is full or the wait times out"""
+        if self.active < self.max_active and not self.waiting:
+            self.active += 1
+            return Ticket(self)
+
+        if self.waiting >= self.max_waiting:
+            shed = self._lanes[NEW_SESSION]
+            if priority == EXISTING_SESSION and shed:
+                REJECTED.labels("shed").inc()
+                shed.pop().set_exception(Overloaded("shed", self.max_wait_s))
+            else:
+                REJECTED.labels("queue_full").inc()
+                raise Overloaded("queue_full", self.max_wait_s)
+
+        future = asyncio.get_running_loop().create_future()
+        lane = self._lanes[priority]
+        lane.append(future)
+        try:
+            await asyncio.wait_for(future, self.max_wait_s)
+        except asyncio.TimeoutError:
+            self._discard(lane, future)
+            REJECTED.labels("timeout").inc()
+            raise Overloaded("timeout", self.max_wait_s)
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the caller went away
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            else:
+                self._discard(lane, future)
+            raise
+        return Ticket(self)
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        ticket = await self.acquire(priority)
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def _release(self):
+        # Hand the slot straight to the next live waiter, existing sessions first
+        for lane in self._lanes:
+            while lane:
+                future = lane.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.active -= 1
+
+    @staticmethod
+    def _discard(lane: Deque[asyncio.Future], future: asyncio.Future):
+        try:
+            lane.remove(future)
+        except ValueError:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "waiting_existing": len(self._lanes[EXISTING_SESSION]),
+            "waiting_new": len(self._lanes[NEW_SESSION]),
+        }
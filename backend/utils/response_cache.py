@@ -0,0 +1,164 @@
+"""
+Response cache in front of KrishnaAI
+
+Keyed by the normalized message, the analysis (topic, emotion, category) and
+the verse id. Lookups try an exact match first, then a near-duplicate match:
+each message's word set gets a MinHash signature, LSH bands over the signature
+find candidates with the same analysis and verse, and a candidate is used
+when its word-set Jaccard similarity clears the threshold and it agrees with
+the query on negation. Eviction is LRU under a byte budget.
+"""
+
+import re
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Words that flip a message's meaning; near-duplicates must agree on them
+NEGATIONS = frozenset({
+    "no", "not", "never", "nothing", "nobody", "none", "neither", "nor", "without",
+    "cant", "can't", "cannot", "dont", "don't", "doesnt", "doesn't", "didnt", "didn't",
+    "isnt", "isn't", "wasnt", "wasn't", "wont", "won't", "shouldnt", "shouldn't",
+})
+
+# 8 bands x 4 rows: pairs at Jaccard 0.8 become candidates ~99% of the time, at 0.3 under 7%
+BANDS = 8
+ROWS = 4
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, _PRIME, size=BANDS * ROWS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=BANDS * ROWS, dtype=np.uint64)
+
+# Fixed bookkeeping per entry on top of the text itself (key tuple, dict slots, signature)
+ENTRY_OVERHEAD_BYTES = 300
+
+Context = Tuple[str, str, str, Optional[int]]
+Key = Tuple[str, Context]
+
+
+def normalize(message: str) -> List[str]:
+    """Lowercase words without punctuation or plural 's'; stopwords are kept"""
+    words = []
+    for word in WORD_PATTERN.findall(message.lower()):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def minhash_bands(words: FrozenSet[str]) -> List[Tuple[int, bytes]]:
+    """(band, band signature) pairs of the MinHash signature of a word set"""
+    hashes = np.array([zlib.crc32(word.encode("utf-8")) % _PRIME for word in words], dtype=np.uint64)
+    signature = ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+    return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class ResponseCache:
+    """Exact + MinHash near-duplicate response cache with a byte budget"""
+
+    def __init__(self, max_bytes: int, min_similarity: float = 0.8, min_words: int = 5):
+        self.max_bytes = max_bytes
+        self.min_similarity = min_similarity
+        self.min_words = min_words  # Shorter messages only match exactly
+        self.bytes = 0
+        # (normalized text, context) -> (response, word set, bands or None, size)
+        self._entries: "OrderedDict[Key, Tuple[str, FrozenSet[str], Optional[List], int]]" = OrderedDict()
+        self._buckets: Dict[Tuple[Context, int, bytes], Set[Key]] = {}
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def context(analysis: Dict, verse: Dict) -> Context:
+        return (analysis.get("topic", ""), analysis.get("emotion", ""),
+                analysis.get("category", ""), verse.get("id"))
+
+    def get(self, message: str, analysis: Dict, verse: Dict) -> Optional[str]:
+        """Cached response for this message or a near-duplicate of it, else None"""
+        words = normalize(message)
+        context = self.context(analysis, verse)
+        key = (" ".join(words), context)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        word_set = frozenset(words)
+        if len(word_set) >= self.min_words:
+            negations = word_set & NEGATIONS
+            best, best_similarity = None, self.min_similarity
+            candidates = set()
+            for band in minhash_bands(word_set):
+                candidates |= self._buckets.get((context, *band), set())
+            for candidate in candidates:
+                other = self._entries[candidate][1]
+                if other & NEGATIONS != negations:
+                    continue
+                similarity = jaccard(word_set, other)
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is not None:
+                self._entries.move_to_end(best)
+                self.near_hits += 1
+                return self._entries[best][0]
+
+        self.misses += 1
+        return None
+
+    def set(self, message: str, analysis: Dict, verse: Dict, response: str):
+        words = normalize(message)
+        context = self.context(analysis, verse)
+        key = (" ".join(words), context)
+        size = len(key[0].encode("utf-8")) + len(response.encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        word_set = frozenset(words)
+        bands = minhash_bands(word_set) if len(word_set) >= self.min_words else None
+        self._entries[key] = (response, word_set, bands, size)
+        self.bytes += size
+        for band in bands or ():
+            self._buckets.setdefault((context, *band), set()).add(key)
+
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Key):
+        _, _, bands, size = self._entries.pop(key)
+        self.bytes -= size
+        for band in bands or ():
+            bucket_key = (key[1], *band)
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,69 @@
+"""
+Verses already shown per session, as one bit per corpus position
+
+Each session gets a bytearray of ceil(len(corpus) / 8) bytes (under 100
+bytes for the Gita), so testing or setting a verse is a single byte
+operation however long the session runs. The bitsets live only in memory, in
+an LRU with the session timeout as TTL. Recommending never reads
+interactions back from the database. A session that was evicted, or that
+moved to another worker, starts over with nothing seen, which at worst
+repeats a verse.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from utils.cache import LRUCache
+
+
+class SeenVerses:
+    """Per-session verse bitsets; safe to use from the agent thread pool"""
+
+    def __init__(self, size: int, max_sessions: int, ttl_seconds: float):
+        self.size = size
+        self._bytes = (size + 7) // 8
+        self._sessions = LRUCache(max_sessions, ttl_seconds)
+        # Reentrant, so a caller holding locked() can still use the methods below
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def locked(self):
+        """Hold the lock across a read-then-mark, so concurrent picks for one session can't interleave"""
+        with self._lock:
+            yield
+
+    def get(self, session_id: str) -> Optional[bytearray]:
+        """The session's bitset, or None if nothing has been shown yet"""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    @staticmethod
+    def contains(bits: Optional[bytearray], position: int) -> bool:
+        return bits is not None and bool(bits[position >> 3] >> (position & 7) & 1)
+
+    def mark(self, session_id: str, position: int):
+        with self._lock:
+            bits = self._sessions.peek(session_id)
+            if bits is None:
+                bits = bytearray(self._bytes)
+                self._sessions.set(session_id, bits)
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def clear(self, session_id: str, positions: Iterable[int]):
+        """Unmark the given verses, e.g. to start another round through a fully seen candidate list"""
+        with self._lock:
+            bits = self._sessions.peek(session_id)
+            if bits is not None:
+                for position in positions:
+                    bits[position >> 3] &= ~(1 << (position & 7)) & 0xFF
+
+    def pop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, float]:
+        return {**self._sessions.stats(), "bytes_per_session": self._bytes}
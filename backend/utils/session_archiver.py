@@ -0,0 +1,337 @@
+"""
+Session expiry: archive idle sessions to cold storage and reclaim their space
+
+A background task wakes every SESSION_EXPIRY_INTERVAL_S and, in batches of
+SESSION_EXPIRY_BATCH_SIZE:
+  1. picks sessions idle longer than SESSION_TIMEOUT_HOURS (covering index scan, reader pool)
+  2. reads their interactions and writes them as one compressed NDJSON segment
+     (zstd if the `zstandard` package is installed, gzip otherwise), fsynced
+  3. deletes the archived rows in one short write transaction, re-checking idleness
+  4. archives and deletes interactions whose session no longer exists (written
+     after it expired, or with a made-up id), scanning only rows newer than the
+     last pass: a row can only be orphaned when it is inserted, since expiry
+     deletes a session's interactions together with it
+  5. returns a bounded number of free pages to the OS with incremental vacuum
+Only the deletes and the vacuum step take the write lock.
+
+With several workers, one process at a time runs expiry (advisory file lock).
+
+Enable incremental vacuum on an existing database (one full VACUUM; run while stopped):
+    python -m utils.session_archiver --enable-incremental-vacuum
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from agents.analyzer import EMOTIONS, TOPICS
+from config import (
+    INCREMENTAL_VACUUM_PAGES, SESSION_ARCHIVE_DIR, SESSION_EXPIRY_BATCH_SIZE,
+    SESSION_EXPIRY_INTERVAL_S, SESSION_TIMEOUT_HOURS,
+)
+from database import now_ms
+from utils.logger import get_logger
+from utils.metrics import registry
+from utils.process_lock import try_lock
+from utils.session_state import decode_counts, decode_path, decode_trend, path_segments, topics_from_mask
+
+try:
+    import zstandard
+except ImportError:  # Optional: gzip segments when zstandard isn't installed
+    zstandard = None
+
+logger = get_logger("session_archiver")
+
+SESSIONS_ARCHIVED = registry.counter(
+    "krishna_sessions_archived_total", "Idle sessions moved to cold storage"
+)
+
+IDLE_SESSIONS_SQL = '''
+    SELECT session_id FROM sessions
+    WHERE last_activity < ?
+    ORDER BY last_activity
+    LIMIT ?
+'''
+
+# Interactions past an id watermark, flagged when their session is gone
+ORPHAN_SCAN_SQL = '''
+    SELECT i.id, s.session_id IS NULL
+    FROM interactions i LEFT JOIN sessions s ON s.session_id = i.session_id
+    WHERE i.id > ?
+    ORDER BY i.id
+    LIMIT ?
+'''
+
+DELETE_ORPHANS_SQL = '''
+    DELETE FROM interactions
+    WHERE id IN ({ids}) AND NOT EXISTS (SELECT 1 FROM sessions s WHERE s.session_id = interactions.session_id)
+'''
+
+INTERACTION_COLUMNS = "id, session_id, user_message, krishna_response, topic, emotion, verse_reference, timestamp"
+
+# Sessions of a batch still idle, read inside the delete's transaction
+STILL_IDLE_SQL = 'SELECT session_id FROM sessions WHERE session_id IN ({ids}) AND last_activity < ?'
+
+DELETE_EXPIRED_SQL = [
+    '''
+    DELETE FROM interactions WHERE session_id IN (
+        SELECT session_id FROM sessions WHERE session_id IN ({ids}) AND last_activity < ?
+    )
+    ''',
+    'DELETE FROM sessions WHERE session_id IN ({ids}) AND last_activity < ?',
+]
+
+
+def _interaction_record(row: tuple) -> Dict:
+    """Archive form of an INTERACTION_COLUMNS row (session_id is on the enclosing record)"""
+    return {
+        "id": row[0], "user_message": row[2], "krishna_response": row[3], "topic": row[4],
+        "emotion": row[5], "verse_reference": row[6], "timestamp": row[7],
+    }
+
+
+def _compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def write_segment(directory: str, records: Iterable[Dict]) -> str:
+    """Write records as one compressed NDJSON segment, durable before returning"""
+    os.makedirs(directory, exist_ok=True)
+    extension = "zst" if zstandard is not None else "gz"
+    path = os.path.join(directory, f"sessions-{now_ms()}-{os.getpid()}.ndjson.{extension}")
+    payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_compress(payload))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_segment(path: str) -> List[Dict]:
+    """Load an archived segment back (either compression)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst segments")
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    else:
+        data = gzip.decompress(data)
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+
+
+class SessionArchiver:
+    """Background expiry of idle sessions into compressed NDJSON segments"""
+
+    def __init__(self, database, archive_dir: str = SESSION_ARCHIVE_DIR,
+                 idle_hours: float = SESSION_TIMEOUT_HOURS, batch_size: int = SESSION_EXPIRY_BATCH_SIZE,
+                 interval_s: float = SESSION_EXPIRY_INTERVAL_S, vacuum_pages: int = INCREMENTAL_VACUUM_PAGES,
+                 on_expired: Optional[Callable[[List[str]], None]] = None):
+        self.db = database
+        self.archive_dir = archive_dir
+        self.idle_ms = int(idle_hours * 3600 * 1000)
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.vacuum_pages = vacuum_pages
+        self.on_expired = on_expired
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+        # Highest interaction id already checked for a parent session (a full scan after each start)
+        self._orphan_watermark = 0
+
+    def start(self) -> bool:
+        """Start the background loop if this process wins the expiry lock"""
+        self._lock_file = try_lock(f"{self.db.db_path}.expiry.lock")
+        if self._lock_file is None:
+            logger.info("[Archiver] Another worker runs session expiry")
+            return False
+        self._task = asyncio.create_task(self._loop())
+        return True
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.expire_idle()
+            except Exception as e:
+                logger.error("[Archiver] Expiry pass failed, will retry: %s", e)
+
+    async def expire_idle(self, max_batches: Optional[int] = None) -> int:
+        """Archive and delete idle sessions batch by batch; returns sessions expired"""
+        cutoff = now_ms() - self.idle_ms
+        expired = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            rows = await self.db.fetchall(IDLE_SESSIONS_SQL, (cutoff, self.batch_size))
+            # Sessions with buffered writes are active; leave them for a later pass
+            session_ids = [row[0] for row in rows if not self.db.pending_session_turns(row[0])]
+            if not session_ids:
+                break
+            expired += await self._archive_batch(session_ids, cutoff)
+            batches += 1
+            if len(rows) < self.batch_size:
+                break
+            # Let /chat writes in between batches
+            await asyncio.sleep(0)
+
+        orphans = await self.sweep_orphans()
+        if expired or orphans:
+            await self.incremental_vacuum()
+        if expired:
+            logger.info("[Archiver] Expired %d idle sessions", expired)
+        return expired
+
+    async def sweep_orphans(self, scan_rows: int = 10_000) -> int:
+        """Archive and delete interactions with no session row; returns rows removed"""
+        removed = 0
+        while True:
+            rows = await self.db.fetchall(ORPHAN_SCAN_SQL, (self._orphan_watermark, scan_rows))
+            if not rows:
+                break
+            orphan_ids = [row[0] for row in rows if row[1]]
+            for start in range(0, len(orphan_ids), self.batch_size):
+                removed += await self._archive_orphans(orphan_ids[start:start + self.batch_size])
+            self._orphan_watermark = rows[-1][0]
+            if len(rows) < scan_rows:
+                break
+            await asyncio.sleep(0)
+        if removed:
+            logger.info("[Archiver] Removed %d interactions without a session", removed)
+        return removed
+
+    async def _archive_orphans(self, ids: List[int]) -> int:
+        placeholders = ",".join("?" * len(ids))
+        rows = await self.db.fetchall(
+            f'SELECT {INTERACTION_COLUMNS} FROM interactions WHERE id IN ({placeholders}) ORDER BY session_id, id', ids
+        )
+        by_session: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_session.setdefault(row[1], []).append(_interaction_record(row))
+        records = [
+            {"session": None, "session_id": session_id, "interactions": interactions}
+            for session_id, interactions in by_session.items()
+        ]
+        path = await asyncio.to_thread(write_segment, self.archive_dir, records)
+
+        async def operation(conn):
+            cursor = await conn.execute(DELETE_ORPHANS_SQL.format(ids=placeholders), ids)
+            return cursor.rowcount
+
+        deleted = await self.db.write(operation)
+        logger.info("[Archiver] Archived %d orphaned interactions to %s", len(rows), path)
+        return deleted
+
+    async def _archive_batch(self, session_ids: List[str], cutoff: int) -> int:
+        placeholders = ",".join("?" * len(session_ids))
+        sessions = await self.db.fetchall(f'''
+            SELECT session_id, user_id, topic_mask, topic_counts, emotion_trend,
+                   emotional_state, message_count, created_at, last_activity, path
+            FROM sessions WHERE session_id IN ({placeholders})
+        ''', session_ids)
+        interactions = await self.db.fetchall(f'''
+            SELECT {INTERACTION_COLUMNS}
+            FROM interactions WHERE session_id IN ({placeholders})
+            ORDER BY session_id, timestamp, id
+        ''', session_ids)
+
+        by_session: Dict[str, List[Dict]] = {row[0]: [] for row in sessions}
+        for row in interactions:
+            by_session.setdefault(row[1], []).append(_interaction_record(row))
+        records = {
+            row[0]: {
+                "session": {
+                    "session_id": row[0], "user_id": row[1], "topics_discussed": topics_from_mask(row[2]),
+                    "topic_counts": dict(zip(TOPICS, decode_counts(row[3]).tolist())),
+                    "emotion_trend": {e: round(v, 4) for e, v in zip(EMOTIONS, decode_trend(row[4]).tolist())},
+                    "emotional_state": row[5], "message_count": row[6], "created_at": row[7],
+                    "last_activity": row[8], "path": path_segments(decode_path(row[9])),
+                },
+                "interactions": by_session.get(row[0], []),
+            }
+            for row in sessions
+        }
+
+        # Compression and fsync happen off the event loop, before anything is deleted
+        path = await asyncio.to_thread(write_segment, self.archive_dir, list(records.values()))
+
+        async def operation(conn):
+            # Writes are serialized, so sessions idle here stay idle until the delete commits
+            async with conn.execute(STILL_IDLE_SQL.format(ids=placeholders), [*session_ids, cutoff]) as cursor:
+                idle = [row[0] for row in await cursor.fetchall()
+                        if row[0] in records and not self.db.pending_session_turns(row[0])]
+            segment = path
+            if len(idle) < len(records):
+                # Some sessions came back since the read: archive only the rest, so none is archived
+                # twice. The old segment goes first; a crash in between leaves the rows for a later pass
+                os.remove(path)
+                segment = None
+                if idle:
+                    segment = await asyncio.to_thread(write_segment, self.archive_dir, [records[s] for s in idle])
+            if idle:
+                idle_placeholders = ",".join("?" * len(idle))
+                for sql in DELETE_EXPIRED_SQL:
+                    await conn.execute(sql.format(ids=idle_placeholders), [*idle, cutoff])
+            return idle, segment
+
+        expired, segment = await self.db.write(operation)
+        if len(expired) < len(records):
+            logger.info("[Archiver] %d sessions became active during archiving; kept", len(records) - len(expired))
+        if not expired:
+            return 0
+        SESSIONS_ARCHIVED.labels().inc(len(expired))
+        if self.on_expired:
+            self.on_expired(expired)
+        logger.info("[Archiver] Archived %d sessions (%d interactions) to %s",
+                    len(expired), sum(len(records[s]["interactions"]) for s in expired), segment)
+        return len(expired)
+
+    async def incremental_vacuum(self):
+        """Release up to vacuum_pages free pages; a no-op unless auto_vacuum is INCREMENTAL"""
+        row = await self.db.fetchone('PRAGMA auto_vacuum')
+        if not row or row[0] != 2:
+            return
+
+        async def operation(conn):
+            # executescript steps the pragma to completion (execute frees a single page);
+            # it commits the writer's empty IMMEDIATE transaction and runs on its own
+            await conn.executescript(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})')
+
+        await self.db.write(operation)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sqlite3
+
+    from config import DATABASE_PATH
+
+    parser = argparse.ArgumentParser(description="Session archive maintenance")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="switch an existing database to auto_vacuum=INCREMENTAL (runs VACUUM)")
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        conn = sqlite3.connect(DATABASE_PATH, isolation_level=None)
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        start = time.perf_counter()
+        conn.execute('VACUUM')
+        print(f"auto_vacuum={conn.execute('PRAGMA auto_vacuum').fetchone()[0]} "
+              f"(VACUUM took {time.perf_counter() - start:.1f}s)")
+        conn.close()
@@ -3,97 +3,151 @@ Session & State Management
 """
 
 import uuid
-from datetime import datetime
 from typing import Dict, Optional
-import json
+
+from config import SESSION_CACHE_SIZE, SESSION_TIMEOUT_HOURS
+from database import INSERT_SESSION_SQL, ms_to_iso, now_ms
+from utils.cache import LRUCache
+from utils.logger import get_logger
+from utils.session_state import (
+    apply_turn, decode_counts, decode_path, decode_trend, emotion_vector, empty_summary, session_summary,
+    topics_from_mask, trends,
+)
+
+logger = get_logger("session_manager")
+
 
 class SessionManager:
     """Manages user sessions and state"""
     
     def __init__(self, database):
         self.db = database
+        # Hot session state, kept coherent by writing through on every change
+        self.cache = LRUCache(SESSION_CACHE_SIZE, SESSION_TIMEOUT_HOURS * 3600)
     
-    def create_session(self, user_id: str) -> str:
+    async def create_session(self, user_id: str) -> str:
         """Create a new session"""
         session_id = str(uuid.uuid4())
+        created_at = now_ms()
         
-        cursor = self.db.conn.cursor()
-        cursor.execute('''
-            INSERT INTO sessions 
-            (session_id, user_id, topics_discussed, emotional_state, created_at, last_activity)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
+        await self.db.execute(INSERT_SESSION_SQL, (
             session_id,
             user_id,
-            json.dumps([]),
             'neutral',
-            datetime.now().isoformat(),
-            datetime.now().isoformat()
+            created_at,
+            created_at
         ))
-        self.db.conn.commit()
         
-        print(f"[SessionManager] Created session {session_id} for user {user_id}")
+        self.cache.set(session_id, {
+            'session_id': session_id,
+            'user_id': user_id,
+            'topic_mask': 0,
+            'topic_counts': decode_counts(None),
+            'emotion_trend': decode_trend(None),
+            'emotional_state': 'neutral',
+            'message_count': 0,
+            'created_at': created_at,
+            'last_activity': created_at,
+            'path': decode_path(None)
+        })
+        
+        logger.info("[SessionManager] Created session %s for user %s", session_id, user_id,
+                    extra={"session_id": session_id, "user_id": user_id})
         return session_id
-    
-    def get_session(self, session_id: str) -> Optional[Dict]:
-        """Get session information"""
-        cursor = self.db.conn.cursor()
-        cursor.execute('''
-            SELECT session_id, user_id, topics_discussed, emotional_state, 
-                   message_count, created_at, last_activity
+
+    async def _state(self, session_id: str) -> Optional[Dict]:
+        """Decoded session row plus buffered turns; the cached copy is this dict"""
+        cached = self.cache.get(session_id)
+        if cached:
+            return cached
+        
+        row = await self.db.fetchone('''
+            SELECT session_id, user_id, topic_mask, topic_counts, emotion_trend,
+                   emotional_state, message_count, created_at, last_activity, path
             FROM sessions WHERE session_id = ?
         ''', (session_id,))
         
-        row = cursor.fetchone()
         if not row:
             return None
         
-        return {
+        session = {
             'session_id': row[0],
             'user_id': row[1],
-            'topics_discussed': json.loads(row[2]),
-            'emotional_state': row[3],
-            'message_count': row[4],
-            'created_at': row[5],
-            'last_activity': row[6]
+            'topic_mask': row[2],
+            'topic_counts': decode_counts(row[3]),
+            'emotion_trend': decode_trend(row[4]),
+            'emotional_state': row[5],
+            'message_count': row[6],
+            'created_at': row[7],
+            'last_activity': row[8],
+            'path': decode_path(row[9])
         }
+
+        # Overlay turns still sitting in the write-behind buffer
+        for turn in self.db.pending_session_turns(session_id):
+            apply_turn(session, turn)
+
+        self.cache.set(session_id, session)
+        return session
     
-    def update_session(self, session_id: str, topic: str, emotion: str):
-        """Update session with new interaction"""
-        session = self.get_session(session_id)
+    async def get_session(self, session_id: str) -> Optional[Dict]:
+        """Get session information, with topic and emotion trends from the stored counters"""
+        session = await self._state(session_id)
         if not session:
-            return
+            return None
+        return {
+            'session_id': session['session_id'],
+            'user_id': session['user_id'],
+            'topics_discussed': topics_from_mask(session['topic_mask']),
+            'emotional_state': session['emotional_state'],
+            'message_count': session['message_count'],
+            'created_at': ms_to_iso(session['created_at']),
+            'last_activity': ms_to_iso(session['last_activity']),
+            'summary': session_summary(session),
+            'trends': trends(session)
+        }
+    
+    async def exists(self, session_id: str) -> bool:
+        """Whether the session is live (cache first, else one primary-key read)"""
+        return await self._state(session_id) is not None
+
+    async def resolve(self, session_id: Optional[str], user_id: str) -> str:
+        """The given session if it is live, else a new one; ids of expired or deleted sessions are not reused"""
+        if session_id and await self.exists(session_id):
+            return session_id
+        if session_id:
+            logger.info("[SessionManager] Unknown session %s, starting a new one", session_id,
+                        extra={"session_id": session_id, "user_id": user_id})
+        return await self.create_session(user_id)
+    
+    async def update_session(self, session_id: str, topic: str, emotion: str,
+                             emotions: Optional[Dict[str, float]] = None):
+        """Update session with new interaction (buffered, applied in the next flush)
+
+        `emotions` are the analyzer's per-emotion scores for the turn; without
+        them the emotion trend moves toward `emotion` alone.
+        """
+        turn = {'topic': topic, 'emotion': emotion, 'emotions': emotion_vector(emotion, emotions),
+                'last_activity': now_ms()}
         
-        # Update topics
-        topics = session['topics_discussed']
-        if topic not in topics:
-            topics.append(topic)
+        # The flush folds the turn in SQL, so there is nothing to read first; keep a cached copy current
+        cached = self.cache.peek(session_id)
+        if cached:
+            apply_turn(cached, turn)
         
-        cursor = self.db.conn.cursor()
-        cursor.execute('''
-            UPDATE sessions 
-            SET topics_discussed = ?,
-                emotional_state = ?,
-                message_count = message_count + 1,
-                last_activity = ?
-            WHERE session_id = ?
-        ''', (
-            json.dumps(topics),
-            emotion,
-            datetime.now().isoformat(),
-            session_id
-        ))
-        self.db.conn.commit()
+        await self.db.buffer_session_turn(session_id, turn)
+    
+    async def get_summary(self, session_id: str) -> Dict:
+        """Rolling topic/emotion summary of the whole session"""
+        session = await self._state(session_id)
+        return session_summary(session) if session else empty_summary()
     
-    def delete_session(self, session_id: str):
+    async def delete_session(self, session_id: str):
         """Delete a session"""
-        cursor = self.db.conn.cursor()
-        cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
-        self.db.conn.commit()
-        print(f"[SessionManager] Deleted session {session_id}")
+        self.cache.pop(session_id)
+        await self.db.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+        logger.info("[SessionManager] Deleted session %s", session_id, extra={"session_id": session_id})
     
-    def get_total_sessions(self) -> int:
+    async def get_total_sessions(self) -> int:
         """Get total number of sessions"""
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM sessions')
-        return cursor.fetchone()[0]
+        return await self.db.count_total_sessions()
@@ -0,0 +1,192 @@
+"""
+Compact per-session state, folded one turn at a time
+
+Stored on the sessions row:
+  topic_mask     INTEGER  bit i set once TOPICS[i] has come up
+  topic_counts   BLOB     uint32 turns per topic
+  emotion_trend  BLOB     float32 per emotion, exponentially decayed:
+                          trend = EMOTION_TREND_DECAY * trend + (1 - decay) * turn intensities
+  path           BLOB     uint32 (topic, emotion, turns) per segment: the run-length
+                          encoded recent trajectory, at most SESSION_SUMMARY_PATH_LENGTH
+                          segments
+
+The rolling summary used in prompts is derived from these (turns from
+message_count, topics from topic_counts), so nothing is stored twice and no
+turn decodes or encodes JSON.
+
+The fold functions are registered as SQLite functions, so a flush applies each
+turn with a single UPDATE that computes the new state from the stored one.
+Nothing is read back into the app first, which means turns written by
+different workers to the same session can't overwrite each other.
+SessionManager uses the same functions to overlay buffered turns and to keep
+its cache current.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from agents.analyzer import EMOTIONS, TOPICS
+from config import EMOTION_TREND_DECAY, SESSION_SUMMARY_PATH_LENGTH
+
+TOPIC_INDEX = {topic: i for i, topic in enumerate(TOPICS)}
+EMOTION_INDEX = {emotion: i for i, emotion in enumerate(EMOTIONS)}
+# Path segments may also carry the analyzer's "no emotion" label
+PATH_EMOTIONS = EMOTIONS + ['neutral']
+PATH_EMOTION_INDEX = {emotion: i for i, emotion in enumerate(PATH_EMOTIONS)}
+
+# An emotion is "rising" when its share of the recent trend beats its share of the path's turns by this much
+RISING_MARGIN = 0.15
+
+
+def empty_summary() -> Dict:
+    return {'turns': 0, 'topics': {}, 'path': []}
+
+
+def decode_path(blob: Optional[bytes]) -> np.ndarray:
+    """(segments, 3) array of topic index, emotion index and turns"""
+    return (np.frombuffer(blob, dtype=np.uint32).reshape(-1, 3).copy() if blob
+            else np.zeros((0, 3), dtype=np.uint32))
+
+
+def fold_path(path: np.ndarray, topic: str, emotion: str) -> np.ndarray:
+    """Extend the last segment or append one, keeping the last SESSION_SUMMARY_PATH_LENGTH"""
+    if topic not in TOPIC_INDEX or emotion not in PATH_EMOTION_INDEX:
+        return path
+    segment = (TOPIC_INDEX[topic], PATH_EMOTION_INDEX[emotion])
+    if len(path) and tuple(path[-1, :2].tolist()) == segment:
+        path = path.copy()
+        path[-1, 2] += 1
+        return path
+    return np.vstack([path, np.array([[*segment, 1]], dtype=np.uint32)])[-SESSION_SUMMARY_PATH_LENGTH:]
+
+
+def path_segments(path: np.ndarray) -> List[List]:
+    """[[topic, emotion, turns], ...], oldest first"""
+    return [[TOPICS[t], PATH_EMOTIONS[e], n] for t, e, n in path.tolist()]
+
+
+def session_summary(session: Dict) -> Dict:
+    """Rolling summary for prompts, derived from a decoded session's counters and path"""
+    return {
+        'turns': session['message_count'],
+        'topics': {topic: int(n) for topic, n in zip(TOPICS, session['topic_counts'].tolist()) if n},
+        'path': path_segments(session['path']),
+    }
+
+
+def topic_bit(topic: str) -> int:
+    return 1 << TOPIC_INDEX[topic] if topic in TOPIC_INDEX else 0
+
+
+def topics_from_mask(mask: int) -> List[str]:
+    return [topic for i, topic in enumerate(TOPICS) if mask >> i & 1]
+
+
+def decode_counts(blob: Optional[bytes]) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.uint32).copy() if blob else np.zeros(len(TOPICS), dtype=np.uint32)
+
+
+def decode_trend(blob: Optional[bytes]) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float32).copy() if blob else np.zeros(len(EMOTIONS), dtype=np.float32)
+
+
+def emotion_vector(emotion: str, intensities: Optional[Dict[str, float]] = None) -> bytes:
+    """A turn's emotion intensities, normalized to sum to 1 (one-hot on the label without scores)"""
+    vector = np.zeros(len(EMOTIONS), dtype=np.float32)
+    for name, value in (intensities or {}).items():
+        if name in EMOTION_INDEX:
+            vector[EMOTION_INDEX[name]] = value
+    if not vector.any() and emotion in EMOTION_INDEX:
+        vector[EMOTION_INDEX[emotion]] = 1.0
+    total = vector.sum()
+    return (vector / total if total else vector).tobytes()
+
+
+def fold_counts(counts: np.ndarray, topic: str) -> np.ndarray:
+    counts = counts.copy()
+    if topic in TOPIC_INDEX:
+        counts[TOPIC_INDEX[topic]] += 1
+    return counts
+
+
+def fold_trend(trend: np.ndarray, vector: bytes) -> np.ndarray:
+    decay = np.float32(EMOTION_TREND_DECAY)
+    return decay * trend + (np.float32(1) - decay) * np.frombuffer(vector, dtype=np.float32)
+
+
+def apply_turn(session: Dict, turn: Dict):
+    """Fold a buffered turn into a decoded session in place, exactly as the flush's UPDATE will
+
+    `session` holds the decoded columns (timestamps in epoch ms); `turn` is a
+    buffered {'topic', 'emotion', 'emotions': emotion_vector(), 'last_activity'}.
+    """
+    session['topic_mask'] |= topic_bit(turn['topic'])
+    session['topic_counts'] = fold_counts(session['topic_counts'], turn['topic'])
+    session['emotion_trend'] = fold_trend(session['emotion_trend'], turn['emotions'])
+    session['path'] = fold_path(session['path'], turn['topic'], turn['emotion'])
+    session['emotional_state'] = turn['emotion']
+    session['message_count'] += 1
+    session['last_activity'] = turn['last_activity']
+
+
+def trends(session: Dict) -> Dict:
+    """Topic counts and emotional direction of a session, from its counters alone"""
+    counts = session['topic_counts']
+    trend = session['emotion_trend']
+    strength = float(trend.sum())
+    # Turns per emotion over the recorded trajectory, the longer view the decayed trend is compared with
+    path = session['path']
+    turns = int(path[:, 2].sum())
+    recorded = np.bincount(path[:, 1], weights=path[:, 2], minlength=len(PATH_EMOTIONS))
+    rising = [
+        emotion for i, emotion in enumerate(EMOTIONS)
+        if strength and turns and trend[i] / strength - recorded[i] / turns >= RISING_MARGIN
+    ]
+    return {
+        'topics': {topic: int(n) for topic, n in zip(TOPICS, counts.tolist()) if n},
+        'emotions': {emotion: round(value, 3) for emotion, value in zip(EMOTIONS, trend.tolist())},
+        'dominant_emotion': EMOTIONS[int(trend.argmax())] if strength else 'neutral',
+        'rising': rising,
+    }
+
+
+# ==================== SQL FUNCTIONS ====================
+
+def _sql_count_topic(blob: Optional[bytes], topic: str) -> bytes:
+    return fold_counts(decode_counts(blob), topic).tobytes()
+
+
+def _sql_decay_emotions(blob: Optional[bytes], vector: bytes) -> bytes:
+    return fold_trend(decode_trend(blob), vector).tobytes()
+
+
+def _sql_fold_path(blob: Optional[bytes], topic: str, emotion: str) -> bytes:
+    return fold_path(decode_path(blob), topic, emotion).tobytes()
+
+
+def _sql_topic_mask(topics_json: Optional[str]) -> int:
+    mask = 0
+    for topic in json.loads(topics_json or '[]'):
+        mask |= topic_bit(topic)
+    return mask
+
+
+def _sql_topic_counts(counts_json: Optional[str]) -> bytes:
+    counts = np.zeros(len(TOPICS), dtype=np.uint32)
+    for topic, n in json.loads(counts_json or '{}').items():
+        if topic in TOPIC_INDEX:
+            counts[TOPIC_INDEX[topic]] = n
+    return counts.tobytes()
+
+
+# (name, argument count, implementation); registered on every connection
+SQL_FUNCTIONS = [
+    ("session_count_topic", 2, _sql_count_topic),
+    ("session_decay_emotions", 2, _sql_decay_emotions),
+    ("session_fold_path", 3, _sql_fold_path),
+    # Used by the migrations that introduced these columns
+    ("session_topic_mask", 1, _sql_topic_mask),
+    ("session_topic_counts", 1, _sql_topic_counts),
+]